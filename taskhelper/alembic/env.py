@@ -9,10 +9,12 @@ from taskhelper.db import Base
 from taskhelper.config import get_settings
 
 config = context.config
-settings = get_settings()
-db_file_path = os.path.join(settings.root, settings.db_path)
-db_path = f"sqlite:///{db_file_path}"
-config.set_main_option("sqlalchemy.url", db_path)
+# taskhelper.db.apply_migrations sets the URL for the root being migrated
+if not config.get_main_option("sqlalchemy.url"):
+    settings = get_settings()
+    db_file_path = os.path.join(settings.root, settings.db_path)
+    db_path = f"sqlite:///{db_file_path}"
+    config.set_main_option("sqlalchemy.url", db_path)
 
 target_metadata = Base.metadata
 
@@ -48,6 +50,15 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # taskhelper.db.apply_migrations passes the shared connection of an
+    # in-memory database, which a new engine could not reach
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
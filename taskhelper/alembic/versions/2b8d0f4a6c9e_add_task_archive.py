@@ -0,0 +1,52 @@
+"""add task archive
+
+Revision ID: 2b8d0f4a6c9e
+Revises: 9a4c6e8b2d1f
+Create Date: 2026-10-19 15:12:48.230561
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2b8d0f4a6c9e"
+down_revision: Union[str, Sequence[str], None] = "9a4c6e8b2d1f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by init_db() already have the tables
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("archived_tasks"):
+        op.create_table(
+            "archived_tasks",
+            sa.Column("hierarchical_id", sa.String(), primary_key=True),
+            sa.Column("title", sa.String(), nullable=False),
+            sa.Column("description", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("priority", sa.String()),
+            sa.Column("complexity", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("parent_hierarchical_id", sa.String()),
+            sa.Column("version", sa.Integer()),
+            sa.Column("archived_at", sa.DateTime()),
+        )
+    if not inspector.has_table("task_archive_state"):
+        op.create_table(
+            "task_archive_state",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("export_mtime_ns", sa.Integer()),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("task_archive_state")
+    op.drop_table("archived_tasks")
@@ -0,0 +1,40 @@
+"""add task version
+
+Revision ID: 3f1a2b9c4d5e
+Revises:
+Create Date: 2026-10-19 09:12:44.318205
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1a2b9c4d5e"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _task_columns() -> set[str]:
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns("tasks")}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by init_db() already have the column
+    if "version" in _task_columns():
+        return
+    with op.batch_alter_table("tasks") as batch_op:
+        batch_op.add_column(
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1")
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("tasks") as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,40 @@
+"""add task trigrams
+
+Revision ID: 5d7f9b1c3e2a
+Revises: 8c2e4d6a1b3f
+Create Date: 2026-10-19 11:21:09.104388
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d7f9b1c3e2a"
+down_revision: Union[str, Sequence[str], None] = "8c2e4d6a1b3f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by init_db() already have the table. The index itself
+    # is filled by taskhelper.db.ensure_similarity_index on startup.
+    if sa.inspect(op.get_bind()).has_table("task_trigrams"):
+        return
+    op.create_table(
+        "task_trigrams",
+        sa.Column("trigram", sa.String(), primary_key=True),
+        sa.Column("task_id", sa.Integer(), primary_key=True),
+        sqlite_with_rowid=False,
+    )
+    op.create_index("ix_task_trigrams_task_id", "task_trigrams", ["task_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_task_trigrams_task_id", table_name="task_trigrams")
+    op.drop_table("task_trigrams")
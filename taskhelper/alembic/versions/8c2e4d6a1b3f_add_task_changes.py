@@ -0,0 +1,40 @@
+"""add task changes
+
+Revision ID: 8c2e4d6a1b3f
+Revises: 3f1a2b9c4d5e
+Create Date: 2026-10-19 10:03:27.551972
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c2e4d6a1b3f"
+down_revision: Union[str, Sequence[str], None] = "3f1a2b9c4d5e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by init_db() already have the table
+    if sa.inspect(op.get_bind()).has_table("task_changes"):
+        return
+    op.create_table(
+        "task_changes",
+        sa.Column("seq", sa.Integer(), primary_key=True),
+        sa.Column("task_id", sa.String(), nullable=False),
+        sa.Column("operation", sa.String(), nullable=False),
+        sa.Column("imported", sa.Boolean(), nullable=False),
+        sa.Column("task", sa.String()),
+        sa.Column("changed_at", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("task_changes")
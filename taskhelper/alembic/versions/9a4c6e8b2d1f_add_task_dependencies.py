@@ -0,0 +1,36 @@
+"""add task dependencies
+
+Revision ID: 9a4c6e8b2d1f
+Revises: 5d7f9b1c3e2a
+Create Date: 2026-10-19 14:02:37.518220
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9a4c6e8b2d1f"
+down_revision: Union[str, Sequence[str], None] = "5d7f9b1c3e2a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by init_db() already have the table
+    if sa.inspect(op.get_bind()).has_table("task_dependencies"):
+        return
+    op.create_table(
+        "task_dependencies",
+        sa.Column("task_id", sa.String(), primary_key=True),
+        sa.Column("blocked_by_id", sa.String(), primary_key=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("task_dependencies")
@@ -1,19 +1,97 @@
+import csv
+from typing import Any, Callable, Iterable, List, Optional, TypeVar
+
 import click
-from typing import Optional, List
+from pydantic import BaseModel
 from tabulate import tabulate
 
 from .db import (
     init_db_with_data,
     create_task,
     get_task,
-    list_tasks,
+    iter_tasks,
     update_task,
     delete_task,
+    changes_since,
+    find_similar_tasks,
+    import_tasks,
+    set_subtree_status,
+    add_dependency,
+    remove_dependency,
+    next_tasks,
+    archive_tasks,
+    list_archived_tasks,
+    TaskConflictError,
+)
+from .config import get_settings
+from .importer import IMPORT_FORMATS, detect_format, read_tasks
+from .profiling import profile_invocation, timed
+from .task import (
+    Task,
+    TaskChange,
+    TaskCreate,
+    TaskUpdate,
+    Status,
+    Priority,
+    Complexity,
 )
-from .task import Task, TaskCreate, TaskUpdate, Status, Priority, Complexity
 
+T = TypeVar("T", bound=BaseModel)
+
+OUTPUT_FORMATS = ["grid", "ndjson", "csv", "tsv", "plain"]
+
+
+def output_format_option(command):
+    return click.option(
+        "--format",
+        "-f",
+        "output_format",
+        type=click.Choice(OUTPUT_FORMATS),
+        default="grid",
+        help="Output format. All formats except grid print rows as they are read.",
+    )(command)
 
-def display_tasks_table(tasks: List[Task]):
+
+def display_rows(
+    items: Iterable[T],
+    headers: List[str],
+    to_row: Callable[[T], List[Any]],
+    output_format: str = "grid",
+):
+    """Print items in the given format, streaming them unless drawing a grid"""
+    with timed("serialization"):
+        _display_rows(items, headers, to_row, output_format)
+
+
+def _display_rows(
+    items: Iterable[T],
+    headers: List[str],
+    to_row: Callable[[T], List[Any]],
+    output_format: str,
+):
+    if output_format == "grid":
+        table_data = [to_row(item) for item in items]
+        # Number parsing would render task IDs such as 1.10 as 1.1
+        click.echo(
+            tabulate(
+                table_data, headers=headers, tablefmt="grid", disable_numparse=True
+            )
+        )
+    elif output_format == "ndjson":
+        for item in items:
+            click.echo(item.model_dump_json())
+    elif output_format == "plain":
+        for item in items:
+            click.echo(" ".join(str(value) for value in to_row(item)))
+    else:
+        dialect = "excel-tab" if output_format == "tsv" else "excel"
+        writer = csv.writer(click.get_text_stream("stdout"), dialect=dialect)
+        writer.writerow(headers)
+        for item in items:
+            writer.writerow(to_row(item))
+
+
+def display_tasks_table(tasks: Iterable[Task], output_format: str = "grid"):
     headers = [
         "ID",
         "Title",
@@ -21,27 +99,67 @@ def display_tasks_table(tasks: List[Task]):
         "Status",
         "Priority",
         "Complexity",
+        "Version",
     ]
-    table_data = []
-    for task in tasks:
-        table_data.append(
-            [
-                task.id,
-                task.title,
-                task.description if task.description else "",
-                task.status,
-                task.priority,
-                task.complexity,
-            ]
-        )
 
-    click.echo(tabulate(table_data, headers=headers, tablefmt="grid"))
+    def to_row(task: Task) -> List[Any]:
+        return [
+            task.id,
+            task.title,
+            task.description if task.description else "",
+            task.status,
+            task.priority,
+            task.complexity,
+            task.version,
+        ]
+
+    display_rows(tasks, headers, to_row, output_format)
+
+
+def display_changes_table(changes: Iterable[TaskChange], output_format: str = "grid"):
+    headers = [
+        "Seq",
+        "Task ID",
+        "Operation",
+        "Title",
+        "Status",
+        "Imported",
+        "Changed At",
+    ]
+
+    def to_row(change: TaskChange) -> List[Any]:
+        return [
+            change.seq,
+            change.task_id,
+            change.operation,
+            change.task.title if change.task else "",
+            change.task.status if change.task else "",
+            "yes" if change.imported else "",
+            change.changed_at,
+        ]
+
+    display_rows(changes, headers, to_row, output_format)
 
 
 @click.group()
-def cli():
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Profile the command, also enabled by TASKHELPER_PROFILE=1",
+)
+@click.option(
+    "--profile-dir",
+    type=click.Path(file_okay=False),
+    help="Folder to write profiles to, relative to the project root",
+)
+@click.pass_context
+def cli(ctx: click.Context, profile: bool, profile_dir: Optional[str]):
     """taskhelper-cli - Manage tasks from the command line"""
-    pass
+    settings = get_settings()
+    settings.profile = settings.profile or profile
+    if profile_dir is not None:
+        settings.profile_dir = profile_dir
+    ctx.with_resource(profile_invocation(f"cli {ctx.invoked_subcommand}"))
 
 
 @cli.command()
@@ -69,6 +187,12 @@ def cli():
     help="Task complexity",
 )
 @click.option("--parent-id", "-P", type=str, help="Parent task ID")
+@click.option(
+    "--dedupe-threshold",
+    type=click.FloatRange(0, 1),
+    help="Refuse to create the task if existing tasks are at least this similar",
+)
+@output_format_option
 def create(
     title: str,
     description: Optional[str],
@@ -76,6 +200,8 @@ def create(
     priority: Priority,
     complexity: Complexity,
     parent_id: Optional[str],
+    dedupe_threshold: Optional[float],
+    output_format: str,
 ):
     """Create a new task"""
     init_db_with_data()
@@ -90,8 +216,8 @@ def create(
     )
 
     try:
-        task = create_task(task_create)
-        display_tasks_table([task])
+        task = create_task(task_create, dedupe_threshold)
+        display_tasks_table([task], output_format)
     except Exception as e:
         click.echo(f"Error creating task: {e}", err=True)
         raise click.Abort()
@@ -106,14 +232,16 @@ def create(
     help="Filter tasks by status (can be used multiple times). Defaults to 'todo' and 'inprogress' if not specified.",
 )
 @click.option("--parent-id", "-P", type=str, help="Filter tasks by parent ID")
-def list(status: tuple[Status, ...], parent_id: Optional[str]):
+@output_format_option
+def list(status: tuple[Status, ...], parent_id: Optional[str], output_format: str):
     """List all tasks"""
     init_db_with_data()
 
     try:
-        statuses = list(status) if status else None
-        tasks = list_tasks(statuses=statuses, parent_id=parent_id)
-        display_tasks_table(tasks)
+        # `list` is this command here, not the builtin
+        statuses = [*status] if status else None
+        tasks = iter_tasks(statuses=statuses, parent_id=parent_id)
+        display_tasks_table(tasks, output_format)
     except Exception as e:
         click.echo(f"Error listing tasks: {e}", err=True)
         raise click.Abort()
@@ -121,7 +249,8 @@ def list(status: tuple[Status, ...], parent_id: Optional[str]):
 
 @cli.command()
 @click.argument("task_id", type=str)
-def get(task_id: str):
+@output_format_option
+def get(task_id: str, output_format: str):
     """Get a task by ID"""
     init_db_with_data()
 
@@ -130,7 +259,34 @@ def get(task_id: str):
         click.echo(f"Task {task_id} not found")
         return
 
-    display_tasks_table([task])
+    display_tasks_table([task], output_format)
+
+
+@cli.command()
+@click.argument("title", type=str)
+@click.option("--description", "-d", help="Task description to compare as well")
+@click.option(
+    "--threshold",
+    type=click.FloatRange(0, 1),
+    default=0.5,
+    help="Minimum similarity score",
+)
+@click.option(
+    "--limit", "-l", type=int, default=10, help="Maximum number of tasks to show"
+)
+@output_format_option
+def similar(
+    title: str,
+    description: Optional[str],
+    threshold: float,
+    limit: int,
+    output_format: str,
+):
+    """Find tasks similar to TITLE"""
+    init_db_with_data()
+
+    matches = find_similar_tasks(title, description, threshold, limit)
+    display_tasks_table([match.task for match in matches], output_format)
 
 
 @cli.command()
@@ -156,6 +312,17 @@ def get(task_id: str):
     help="New task complexity",
 )
 @click.option("--parent-id", "-P", type=str, help="New parent task ID")
+@click.option(
+    "--expected-version",
+    type=int,
+    help="Only update if the task is still at this version",
+)
+@click.option(
+    "--subtree",
+    is_flag=True,
+    help="Apply --status to the task and all of its descendants",
+)
+@output_format_option
 def update(
     task_id: str,
     title: Optional[str],
@@ -164,8 +331,23 @@ def update(
     priority: Optional[Priority],
     complexity: Optional[Complexity],
     parent_id: Optional[str],
+    expected_version: Optional[int],
+    subtree: bool,
+    output_format: str,
 ):
     """Update a task by ID"""
+    if subtree:
+        other_options = (
+            title,
+            description,
+            priority,
+            complexity,
+            parent_id,
+            expected_version,
+        )
+        if status is None or any(option is not None for option in other_options):
+            raise click.UsageError("--subtree requires --status and no other options")
+
     init_db_with_data()
 
     existing_task = get_task(task_id)
@@ -173,6 +355,11 @@ def update(
         click.echo(f"Task {task_id} not found")
         return
 
+    if subtree:
+        assert status is not None
+        display_tasks_table(set_subtree_status(task_id, status) or [], output_format)
+        return
+
     task_update = TaskUpdate(
         title=title,
         description=description,
@@ -182,25 +369,220 @@ def update(
         parent_id=parent_id,
     )
 
-    updated_task = update_task(task_id, task_update)
+    try:
+        updated_task = update_task(task_id, task_update, expected_version)
+    except TaskConflictError as e:
+        click.echo(f"Error updating task: {e}", err=True)
+        raise click.Abort()
+
     if updated_task:
-        display_tasks_table([updated_task])
+        display_tasks_table([updated_task], output_format)
     else:
         click.echo(f"Failed to update task #{task_id}")
 
 
 @cli.command()
 @click.argument("task_id", type=str)
-def delete(task_id: str):
+@click.option(
+    "--expected-version",
+    type=int,
+    help="Only delete if the task is still at this version",
+)
+@output_format_option
+def delete(task_id: str, expected_version: Optional[int], output_format: str):
     """Delete a task by ID"""
     init_db_with_data()
 
-    deleted_task = delete_task(task_id)
+    try:
+        deleted_task = delete_task(task_id, expected_version)
+    except TaskConflictError as e:
+        click.echo(f"Error deleting task: {e}", err=True)
+        raise click.Abort()
+
     if deleted_task:
-        display_tasks_table([deleted_task])
+        display_tasks_table([deleted_task], output_format)
     else:
         click.echo(f"Task {task_id} not found")
 
 
+@cli.command(name="import")
+@click.argument("path", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option(
+    "--format",
+    "-f",
+    "input_format",
+    type=click.Choice(IMPORT_FORMATS),
+    help="Input format. Detected from the file extension if not given.",
+)
+@click.option(
+    "--status",
+    "-s",
+    type=click.Choice(["todo", "inprogress", "done"]),
+    default="todo",
+    help="Status of tasks that do not set one",
+)
+@click.option(
+    "--priority",
+    "-p",
+    type=click.Choice(["low", "medium", "high"]),
+    default="medium",
+    help="Priority of tasks that do not set one",
+)
+@click.option(
+    "--complexity",
+    "-c",
+    type=click.Choice(["low", "medium", "high"]),
+    default="medium",
+    help="Complexity of tasks that do not set one",
+)
+@click.option(
+    "--parent-id", "-P", type=str, help="Import top-level tasks under this task"
+)
+def import_(
+    path: str,
+    input_format: Optional[str],
+    status: Status,
+    priority: Priority,
+    complexity: Complexity,
+    parent_id: Optional[str],
+):
+    """Import tasks from an ndjson, CSV/TSV or Markdown checklist file
+
+    Records may set ref to name themselves and parent to the ref of an earlier
+    record. Markdown checklist items are nested by indentation. Fields other
+    than title, description, status, priority, complexity, parent_id, ref and
+    parent are rejected.
+    """
+    if input_format is None:
+        if path == "-":
+            raise click.UsageError("--format is required when reading from stdin")
+        try:
+            input_format = detect_format(path)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+
+    init_db_with_data()
+
+    defaults = {
+        "status": status,
+        "priority": priority,
+        "complexity": complexity,
+        "parent_id": parent_id,
+    }
+    try:
+        with click.open_file(path) as fp:
+            result = import_tasks(read_tasks(fp, input_format, defaults))
+    except Exception as e:
+        click.echo(f"Error importing tasks: {e}", err=True)
+        raise click.Abort()
+
+    click.echo(
+        f"Imported {result.imported} tasks in {result.seconds:.2f}s "
+        f"({result.tasks_per_second:.0f} tasks/s)"
+    )
+
+
+@cli.command()
+@click.argument("task_id", type=str)
+@click.argument("blocked_by_id", type=str)
+def block(task_id: str, blocked_by_id: str):
+    """Mark TASK_ID as blocked until BLOCKED_BY_ID is done"""
+    init_db_with_data()
+
+    try:
+        dependency = add_dependency(task_id, blocked_by_id)
+    except Exception as e:
+        click.echo(f"Error adding dependency: {e}", err=True)
+        raise click.Abort()
+
+    if dependency:
+        click.echo(f"Task {task_id} is blocked by {blocked_by_id}")
+    else:
+        click.echo(f"Task {task_id} or {blocked_by_id} not found")
+
+
+@cli.command()
+@click.argument("task_id", type=str)
+@click.argument("blocked_by_id", type=str)
+def unblock(task_id: str, blocked_by_id: str):
+    """Remove the dependency of TASK_ID on BLOCKED_BY_ID"""
+    init_db_with_data()
+
+    if remove_dependency(task_id, blocked_by_id):
+        click.echo(f"Task {task_id} is no longer blocked by {blocked_by_id}")
+    else:
+        click.echo(f"Task {task_id} is not blocked by {blocked_by_id}")
+
+
+@cli.command(name="next")
+@click.option(
+    "--limit", "-l", type=int, default=10, help="Maximum number of tasks to show"
+)
+@click.option(
+    "--parent-id", "-P", type=str, help="Only consider the subtree of this task"
+)
+@output_format_option
+def next_(limit: int, parent_id: Optional[str], output_format: str):
+    """List unblocked todo tasks, highest priority and lowest complexity first"""
+    init_db_with_data()
+
+    display_tasks_table(next_tasks(limit, parent_id), output_format)
+
+
+@cli.command()
+@click.argument("task_id", type=str, required=False)
+@click.option(
+    "--older-than",
+    type=click.FloatRange(0),
+    help="Only archive tasks last updated at least this many days ago",
+)
+@output_format_option
+def archive(task_id: Optional[str], older_than: Optional[float], output_format: str):
+    """Archive completed subtrees, or only the subtree of TASK_ID"""
+    init_db_with_data()
+
+    try:
+        roots = archive_tasks(task_id, older_than)
+    except Exception as e:
+        click.echo(f"Error archiving tasks: {e}", err=True)
+        raise click.Abort()
+
+    if roots is None:
+        click.echo(f"Task {task_id} not found")
+        return
+
+    display_tasks_table(roots, output_format)
+
+
+@cli.command()
+@click.argument("task_id", type=str, required=False)
+@output_format_option
+def archived(task_id: Optional[str], output_format: str):
+    """List archived tasks, or only the subtree of TASK_ID"""
+    init_db_with_data()
+
+    display_tasks_table(list_archived_tasks(task_id), output_format)
+
+
+@cli.command()
+@click.argument("seq", type=int, default=0)
+@click.option(
+    "--limit", "-l", type=int, default=100, help="Maximum number of changes to show"
+)
+@output_format_option
+def changes(seq: int, limit: int, output_format: str):
+    """List task changes recorded after sequence number SEQ"""
+    init_db_with_data()
+
+    feed = changes_since(seq, limit)
+    if feed.reset:
+        click.echo(
+            f"Changes after {seq} have been compacted, list tasks to resync", err=True
+        )
+    display_changes_table(feed.changes, output_format)
+    if feed.has_more:
+        click.echo(f"More changes available after {feed.last_seq}", err=True)
+
+
 if __name__ == "__main__":
     cli()
@@ -10,8 +10,26 @@ class Settings:
         parser = argparse.ArgumentParser()
         parser.add_argument("--root", default=os.getcwd())
         parser.add_argument("--db-path", default=".tasks.db")
+        parser.add_argument("--storage", choices=["file", "memory"], default="file")
+        parser.add_argument("--snapshot-interval", type=float, default=60.0)
         parser.add_argument("--tasks-path", default=".tasks")
         parser.add_argument("--transport", default="stdio")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument("--multi-root", action="store_true")
+        parser.add_argument("--max-open-roots", type=int, default=16)
+        parser.add_argument("--root-idle-timeout", type=float, default=600.0)
+        parser.add_argument("--change-log-size", type=int, default=10000)
+        parser.add_argument("--archive-after-days", type=float, default=None)
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            default=os.environ.get("TASKHELPER_PROFILE", "") not in ("", "0"),
+        )
+        parser.add_argument(
+            "--profile-dir",
+            default=os.environ.get("TASKHELPER_PROFILE_DIR", ".taskhelper-profiles"),
+        )
         parser.add_argument(
             "--log-level",
             default="INFO",
@@ -22,8 +40,19 @@ class Settings:
 
         self.root = args.root
         self.db_path = args.db_path
+        self.storage = "memory" if args.db_path == ":memory:" else args.storage
+        self.snapshot_interval = args.snapshot_interval
         self.tasks_path = args.tasks_path
         self.transport = args.transport
+        self.host = args.host
+        self.port = args.port
+        self.multi_root = args.multi_root
+        self.max_open_roots = args.max_open_roots
+        self.root_idle_timeout = args.root_idle_timeout
+        self.change_log_size = args.change_log_size
+        self.archive_after_days = args.archive_after_days
+        self.profile = args.profile
+        self.profile_dir = args.profile_dir
         self.log_level = args.log_level
 
 
@@ -1,28 +1,72 @@
-from datetime import datetime, timezone
+import atexit
+from collections import Counter, OrderedDict
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+from datetime import datetime, timedelta, timezone
 import logging
+import math
 import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 import alembic.config
 import alembic.command
 from sqlalchemy import (
     create_engine,
+    Boolean,
     Column,
+    case,
+    select,
     Integer,
     String,
     DateTime,
     ForeignKey,
+    Engine,
     event,
+    exists,
+    func,
+    inspect,
+    or_,
+    text,
+    update,
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
+from sqlalchemy.orm import aliased, sessionmaker, relationship, Session
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.pool import StaticPool
 
 from .config import get_settings
 from .diff import (
     dump_database as diff_dump_database,
     load_database as diff_load_database,
 )
-from .task import TaskCreate, TaskUpdate, Status
+from .profiling import timed
+from .similarity import jaccard, task_text, trigrams
+from .task import (
+    ChangeFeed,
+    ChangeOperation,
+    ImportResult,
+    PartialTask,
+    SimilarTask,
+    TaskField,
+    TaskCreate,
+    TaskImport,
+    TaskUpdate,
+    Status,
+)
 from .task import Task as TaskModel
+from .task import TaskChange as TaskChangeModel
+from .task import TaskDependency as TaskDependencyModel
+from .task import task_fields
 
 logging.basicConfig(level=get_settings().log_level)
 logger = logging.getLogger(__name__)
@@ -30,16 +74,29 @@ logger = logging.getLogger(__name__)
 Base = declarative_base()
 
 
+class TaskConflictError(Exception):
+    """Raised when a task was modified by another writer since it was read"""
+
+    def __init__(self, task_id: str, expected_version: int | None, version: int | None):
+        self.task_id = task_id
+        self.expected_version = expected_version
+        self.version = version
+        super().__init__(
+            f"Task {task_id} was modified concurrently: "
+            f"expected version {expected_version}, found {version}"
+        )
+
+
 class Task(Base):
     """Task model for the database"""
 
     __tablename__ = "tasks"
 
     id = Column(Integer, primary_key=True)
-    hierarchical_id = Column(String, nullable=False)
+    hierarchical_id = Column(String, nullable=False, index=True)
     title = Column(String, nullable=False)
     description = Column(String)
-    status = Column(String)
+    status = Column(String, index=True)
     priority = Column(String)
     complexity = Column(String)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -49,74 +106,441 @@ class Task(Base):
         onupdate=lambda: datetime.now(timezone.utc),
     )
     parent_hierarchical_id = Column(
-        String, ForeignKey("tasks.hierarchical_id"), nullable=True
+        String, ForeignKey("tasks.hierarchical_id"), nullable=True, index=True
     )
+    version = Column(Integer, nullable=False, server_default="1")
 
     child_tasks = relationship(
         "Task", backref="parent_task", remote_side=[hierarchical_id]
     )
 
+    __mapper_args__ = {"version_id_col": version}
+
+
+class TaskChange(Base):
+    """Append-only log of task changes, ordered by seq"""
+
+    __tablename__ = "task_changes"
+
+    seq = Column(Integer, primary_key=True)
+    task_id = Column(String, nullable=False)
+    operation = Column(String, nullable=False)
+    imported = Column(Boolean, nullable=False, default=False)
+    task = Column(String)
+    changed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class TaskTrigram(Base):
+    """Trigram index over task titles and descriptions for similarity lookups"""
+
+    __tablename__ = "task_trigrams"
+
+    trigram = Column(String, primary_key=True)
+    task_id = Column(Integer, primary_key=True, index=True)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class TaskDependency(Base):
+    """Edge recording that task_id cannot start before blocked_by_id is done"""
+
+    __tablename__ = "task_dependencies"
+
+    task_id = Column(String, primary_key=True)
+    blocked_by_id = Column(String, primary_key=True)
+
+
+class ArchivedTask(Base):
+    """Completed task moved out of the tasks table by archive_tasks"""
+
+    __tablename__ = "archived_tasks"
+
+    hierarchical_id = Column(String, primary_key=True)
+    title = Column(String, nullable=False)
+    description = Column(String)
+    status = Column(String)
+    priority = Column(String)
+    complexity = Column(String)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    parent_hierarchical_id = Column(String)
+    version = Column(Integer)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class ArchiveState(Base):
+    """Modification time of the archive export when it was last loaded or written"""
+
+    __tablename__ = "task_archive_state"
+
+    id = Column(Integer, primary_key=True)
+    export_mtime_ns = Column(Integer)
+
+
+# Columns backing each field of the Task model, used for projections
+TASK_FIELD_COLUMNS = {
+    "id": Task.hierarchical_id,
+    "title": Task.title,
+    "description": Task.description,
+    "status": Task.status,
+    "priority": Task.priority,
+    "complexity": Task.complexity,
+    "created_at": Task.created_at,
+    "updated_at": Task.updated_at,
+    "parent_id": Task.parent_hierarchical_id,
+    "version": Task.version,
+}
+
+# Derived tables that are rebuilt locally and kept out of the diffable export
+LOCAL_TABLES = [
+    TaskChange.__tablename__,
+    TaskTrigram.__tablename__,
+    ArchiveState.__tablename__,
+]
+
+# Tables exported to the archive folder instead of the main export
+ARCHIVE_TABLES = [ArchivedTask.__tablename__]
+
+
+class DuplicateTaskError(Exception):
+    """Raised when creating a task that is too similar to an existing one"""
+
+    def __init__(self, matches: list[SimilarTask]):
+        self.matches = matches
+        similar = ", ".join(f"{m.task.id} ({m.score:.2f})" for m in matches)
+        super().__init__(f"Similar tasks already exist: {similar}")
+
+
+class DependencyCycleError(Exception):
+    """Raised when a dependency would make a task transitively block itself"""
+
+    def __init__(self, task_id: str, blocked_by_id: str):
+        self.task_id = task_id
+        self.blocked_by_id = blocked_by_id
+        super().__init__(
+            f"Task {task_id} cannot be blocked by {blocked_by_id}: "
+            f"{blocked_by_id} already depends on {task_id}"
+        )
+
+
+def _next_position(connection, parent_id: str | None) -> int:
+    """Next free child position under parent_id
+
+    Positions follow the highest position used by any ID under parent_id,
+    archived ones included. IDs are matched by shape rather than by parent
+    link, as moved tasks keep their IDs, and descendants count too, so no
+    existing ID starts with the new one. The ID of a deleted task is handed out
+    again only if it had the highest position and no remaining descendants.
+    """
+    if parent_id is None:
+        # CAST reads the leading integer, the first part of the ID
+        under_parent = ""
+        offset = 1
+    else:
+        # "/" sorts right after ".", bounding the IDs that start with "parent."
+        under_parent = (
+            " WHERE hierarchical_id > :prefix AND hierarchical_id < :prefix_end"
+        )
+        offset = len(parent_id) + 2
+
+    position = connection.execute(
+        text(
+            "SELECT MAX(CAST(substr(hierarchical_id, :offset) AS INTEGER)) FROM ("
+            f" SELECT hierarchical_id FROM tasks{under_parent}"
+            " UNION ALL"
+            f" SELECT hierarchical_id FROM archived_tasks{under_parent}"
+            ")"
+        ),
+        {
+            "offset": offset,
+            "prefix": f"{parent_id}.",
+            "prefix_end": f"{parent_id}/",
+        },
+    ).scalar()
+    return (position or 0) + 1
+
 
 @event.listens_for(Task, "before_insert")
 def calculate_hierarchical_id(mapper, connection, target):
     """Automatically calculate hierarchical_id before a task is inserted"""
-    from sqlalchemy import text
+    parent_id = target.parent_hierarchical_id
+    position = _next_position(connection, parent_id)
+    target.hierarchical_id = f"{parent_id}.{position}" if parent_id else str(position)
 
-    if target.parent_hierarchical_id is None:
-        count_result = connection.execute(
-            text("SELECT COUNT(*) FROM tasks WHERE parent_hierarchical_id IS NULL")
-        ).fetchone()
-        target.hierarchical_id = str(count_result[0] + 1)
-    else:
-        parent_id = target.parent_hierarchical_id
 
-        sibling_count_result = connection.execute(
-            text(
-                "SELECT COUNT(*) FROM tasks WHERE parent_hierarchical_id = :parent_id"
-            ),
-            {"parent_id": target.parent_hierarchical_id},
-        ).fetchone()
-        sibling_position = sibling_count_result[0] + 1
+def _trigram_rows(task_id: int, title: str, description: str | None) -> list[dict]:
+    """Build the trigram index rows of a task"""
+    return [
+        {"trigram": trigram, "task_id": task_id}
+        for trigram in trigrams(task_text(title, description))
+    ]
+
+
+def _index_task(connection, task_id: int, title: str, description: str | None):
+    """Replace the trigram index entries of a task"""
+    _unindex_task(connection, task_id)
+    rows = _trigram_rows(task_id, title, description)
+    if rows:
+        connection.execute(TaskTrigram.__table__.insert(), rows)
+
+
+def _unindex_task(connection, task_id: int):
+    """Remove a task from the trigram index"""
+    connection.execute(
+        TaskTrigram.__table__.delete().where(TaskTrigram.task_id == task_id)
+    )
+
+
+@event.listens_for(Task, "after_insert")
+def index_inserted_task(mapper, connection, target):
+    """Add a new task to the trigram index in the same transaction"""
+    _index_task(connection, target.id, target.title, target.description)
+
+
+@event.listens_for(Task, "after_update")
+def index_updated_task(mapper, connection, target):
+    """Reindex a task whose title or description changed"""
+    state = inspect(target)
+    if (
+        state.attrs.title.history.has_changes()
+        or state.attrs.description.history.has_changes()
+    ):
+        _index_task(connection, target.id, target.title, target.description)
+
+
+@event.listens_for(Task, "after_delete")
+def unindex_deleted_task(mapper, connection, target):
+    """Remove a deleted task from the trigram index"""
+    _unindex_task(connection, target.id)
+
+
+@dataclass
+class _RootEngine:
+    """Engine and session factory for one project root"""
+
+    engine: Engine
+    session_factory: sessionmaker[Session]
+    last_used: float
+    # Connection shared by all sessions when the database is held in memory
+    connection: sqlite3.Connection | None = None
+    # Whether the in-memory database changed since its last snapshot
+    dirty: bool = False
+    last_snapshot: float = 0.0
+
+
+_root_override: ContextVar[str | None] = ContextVar("root_override", default=None)
+_engines: OrderedDict[str, _RootEngine] = OrderedDict()
+_engines_lock = threading.RLock()
+
+
+def current_root() -> str:
+    """Get the project root database operations currently apply to"""
+    return os.path.abspath(_root_override.get() or get_settings().root)
+
+
+def in_memory_storage() -> bool:
+    """Whether databases are held in memory and snapshotted to disk"""
+    return get_settings().storage == "memory"
+
+
+def get_db_path() -> str:
+    """Get the SQLite database path for the current root, which in-memory
+    databases are restored from and snapshotted to"""
+    db_path = get_settings().db_path
+    if db_path == ":memory:":
+        db_path = ".tasks.db"
+    return os.path.join(current_root(), db_path)
+
 
-        target.hierarchical_id = f"{parent_id}.{sibling_position}"
+def get_tasks_path() -> str:
+    """Get the diffable files folder for the current root"""
+    return os.path.join(current_root(), get_settings().tasks_path)
 
 
-engine = None
-SessionLocal: sessionmaker[Session] | None = None
+# Lock files held by the current thread or task, making export_lock reentrant
+_held_export_locks: ContextVar[frozenset[str]] = ContextVar(
+    "held_export_locks", default=frozenset()
+)
+
+
+@contextmanager
+def export_lock():
+    """Hold an advisory lock on the diffable files while reading or writing them
+
+    Writers hold it from before they change the database until their export is
+    written, as a process loading the export in between would overwrite their
+    committed changes with the stale export. It is reentrant, so the export
+    helpers they call take it again.
+    """
+    lock_path = f"{get_db_path()}.lock"
+    held = _held_export_locks.get()
+    if lock_path in held:
+        yield
+        return
 
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        token = _held_export_locks.set(held | {lock_path})
+        try:
+            yield
+        finally:
+            _held_export_locks.reset(token)
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
-def init_db_engine():
-    """Initialize the database engine with configured path"""
-    global engine, SessionLocal
+
+def _close_idle_engines():
+    """Dispose engines that have been idle too long or exceed the pool size"""
     settings = get_settings()
-    db_path = os.path.join(settings.root, settings.db_path)
+    now = time.monotonic()
+    for root, entry in list(_engines.items()):
+        if now - entry.last_used > settings.root_idle_timeout:
+            logger.debug(f"Closing idle database for root: {root}")
+            _dispose_engine(root, _engines.pop(root))
+    while len(_engines) > max(settings.max_open_roots, 1):
+        root, entry = _engines.popitem(last=False)
+        logger.debug(f"Closing least recently used database for root: {root}")
+        _dispose_engine(root, entry)
+
+
+def _dispose_engine(root: str, entry: _RootEngine):
+    """Close a root's engine, first snapshotting an in-memory database that
+    would otherwise be lost"""
+    try:
+        if entry.dirty:
+            _snapshot(root, entry)
+    finally:
+        entry.engine.dispose()
+
+
+def init_db_engine() -> _RootEngine:
+    """Initialize the database engine for the current root"""
+    root = current_root()
+    db_path = get_db_path()
     db_dir = os.path.dirname(db_path) if os.path.dirname(db_path) else "."
     os.makedirs(db_dir, exist_ok=True)
-    engine = create_engine(f"sqlite:///{db_path}")
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    connection = None
+    if in_memory_storage():
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        if os.path.exists(db_path):
+            # Resume from the last snapshot, as reopening the file would
+            with closing(sqlite3.connect(db_path)) as snapshot:
+                snapshot.backup(connection)
+        engine = create_engine(
+            "sqlite://", creator=lambda: connection, poolclass=StaticPool
+        )
+    else:
+        engine = create_engine(f"sqlite:///{db_path}")
+    event.listen(engine, "connect", register_sql_functions)
+    entry = _RootEngine(
+        engine=engine,
+        session_factory=sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        last_used=time.monotonic(),
+        connection=connection,
+        last_snapshot=time.monotonic(),
+    )
+    with _engines_lock:
+        _engines[root] = entry
+        _close_idle_engines()
+    return entry
+
+
+def _get_root_engine() -> _RootEngine:
+    """Get the pooled engine for the current root, opening it if needed"""
+    root = current_root()
+    with _engines_lock:
+        entry = _engines.get(root)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            _engines.move_to_end(root)
+            _close_idle_engines()
+            return entry
+    return init_db_engine()
+
+
+def get_engine() -> Engine:
+    """Get the database engine for the current root, opening it if needed"""
+    return _get_root_engine().engine
+
+
+def is_root_open(root: str | None = None) -> bool:
+    """Check whether the database for a root is currently held open"""
+    with _engines_lock:
+        return os.path.abspath(root or current_root()) in _engines
+
+
+def close_root(root: str | None = None):
+    """Close the database of a root, snapshotting it first if it is in memory"""
+    root = os.path.abspath(root or current_root())
+    with _engines_lock:
+        entry = _engines.pop(root, None)
+        if entry is not None:
+            _dispose_engine(root, entry)
+
+
+@atexit.register
+def _snapshot_on_exit():
+    """Snapshot in-memory databases that changed since their last snapshot"""
+    with _engines_lock:
+        for root, entry in list(_engines.items()):
+            if not entry.dirty:
+                continue
+            try:
+                _snapshot(root, entry)
+            except Exception:
+                logger.exception(f"Failed to snapshot database for root: {root}")
+
+
+@contextmanager
+def open_root(root: str | None = None):
+    """Run database operations against root, initializing it on first use"""
+    if root is not None and not os.path.isdir(root):
+        raise ValueError(f"Root {root} is not a directory")
+
+    token = _root_override.set(os.path.abspath(root) if root else None)
+    try:
+        if not is_root_open():
+            init_db_with_data()
+        yield
+    finally:
+        _root_override.reset(token)
 
 
 def init_db():
     """Initialize the database and create tables"""
-    if engine is None:
-        init_db_engine()
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
 
 def get_db() -> Session:
     """Get database session"""
-    if SessionLocal is None:
-        init_db_engine()
-    assert SessionLocal is not None
-    db = SessionLocal()
+    db = _get_root_engine().session_factory()
     try:
         return db
     finally:
         db.close()
 
 
-def create_task(task_create: TaskCreate) -> TaskModel:
-    """Create a new task in the database using Pydantic model and return the created Task"""
+@export_lock()
+def create_task(
+    task_create: TaskCreate, dedupe_threshold: float | None = None
+) -> TaskModel:
+    """Create a new task in the database using Pydantic model and return the created Task
+
+    If dedupe_threshold is given, DuplicateTaskError is raised instead when
+    existing tasks are at least that similar to the new one.
+    """
+    if dedupe_threshold is not None:
+        matches = find_similar_tasks(
+            task_create.title, task_create.description, dedupe_threshold
+        )
+        if matches:
+            raise DuplicateTaskError(matches)
+
+    # Archived siblings take part in allocating the new task's ID
+    load_archive()
+
     db = get_db()
     try:
         task = Task(
@@ -128,6 +552,8 @@ def create_task(task_create: TaskCreate) -> TaskModel:
             parent_hierarchical_id=task_create.parent_id,
         )
         db.add(task)
+        db.flush()
+        record_change(db, "create", TaskModel.from_db(task))
         db.commit()
         db.refresh(task)
 
@@ -141,10 +567,31 @@ def create_task(task_create: TaskCreate) -> TaskModel:
         db.close()
 
 
-def get_task(task_id: str) -> TaskModel | None:
-    """Get a task by ID and return as Pydantic model"""
+def _query_partial_tasks(
+    db: Session, fields: list[TaskField], *criteria
+) -> list[PartialTask]:
+    """Select only the columns for the given fields of matching tasks"""
+    columns = task_fields(fields)
+    query = db.query(*(TASK_FIELD_COLUMNS[field] for field in columns))
+    return [
+        PartialTask(**dict(zip(columns, row, strict=True)))
+        for row in query.filter(*criteria)
+    ]
+
+
+def get_task(
+    task_id: str, fields: list[TaskField] | None = None
+) -> TaskModel | PartialTask | None:
+    """Get a task by ID and return as Pydantic model
+
+    If fields is given only those fields (and id) are read and returned.
+    """
     db = get_db()
     try:
+        if fields is not None:
+            tasks = _query_partial_tasks(db, fields, Task.hierarchical_id == task_id)
+            return tasks[0] if tasks else None
+
         task = db.query(Task).filter(Task.hierarchical_id == task_id).first()
         if task:
             return TaskModel.from_db(task)
@@ -154,42 +601,202 @@ def get_task(task_id: str) -> TaskModel | None:
         db.close()
 
 
-def list_tasks(
-    statuses: list[Status] | None = None, parent_id: str | None = None
-) -> list[TaskModel]:
-    """List all tasks, optionally filtered by statuses or parent_id, ordered hierarchically"""
-    if statuses is None:
-        statuses = ["todo", "inprogress"]
+def find_similar_tasks(
+    title: str,
+    description: str | None = None,
+    threshold: float = 0.5,
+    limit: int = 10,
+) -> list[SimilarTask]:
+    """Find tasks whose title and description are similar to the given text
+
+    Candidates are looked up through the trigram index and scored by Jaccard
+    similarity of their trigram sets, most similar first.
+    """
+    query_trigrams = trigrams(task_text(title, description))
+    if not query_trigrams:
+        return []
 
     db = get_db()
     try:
-        query = db.query(Task)
-        if statuses:
-            query = query.filter(Task.status.in_(statuses))
-        if parent_id is not None:
-            query = query.filter(Task.parent_hierarchical_id == parent_id)
+        # A task reaching the threshold shares at least ceil(threshold * n) of
+        # the n query trigrams, so it must contain one of the n - that + 1
+        # rarest ones. Only their postings are scanned for candidates.
+        frequencies = dict(
+            db.query(TaskTrigram.trigram, func.count())
+            .filter(TaskTrigram.trigram.in_(query_trigrams))
+            .group_by(TaskTrigram.trigram)
+            .all()
+        )
+        min_shared = max(math.ceil(threshold * len(query_trigrams)), 1)
+        prefix = sorted(query_trigrams, key=lambda t: frequencies.get(t, 0))[
+            : len(query_trigrams) - min_shared + 1
+        ]
+        candidates = (
+            select(TaskTrigram.task_id)
+            .where(TaskTrigram.trigram.in_(prefix))
+            .distinct()
+            .scalar_subquery()
+        )
+        shared = func.sum(case((TaskTrigram.trigram.in_(query_trigrams), 1), else_=0))
+        counts = (
+            db.query(TaskTrigram.task_id, shared, func.count())
+            .filter(TaskTrigram.task_id.in_(candidates))
+            .group_by(TaskTrigram.task_id)
+            .having(shared >= min_shared)
+        )
 
-        tasks = query.all()
+        scores = {
+            task_id: jaccard(shared, len(query_trigrams), count)
+            for task_id, shared, count in counts
+        }
+        best = sorted(
+            (task_id for task_id, score in scores.items() if score >= threshold),
+            key=lambda task_id: scores[task_id],
+            reverse=True,
+        )[:limit]
+        if not best:
+            return []
 
-        task_models = [TaskModel.from_db(task) for task in tasks]
+        tasks = {task.id: task for task in db.query(Task).filter(Task.id.in_(best))}
+        return [
+            SimilarTask(task=TaskModel.from_db(tasks[task_id]), score=scores[task_id])
+            for task_id in best
+        ]
+    finally:
+        db.close()
 
-        def hierarchical_key(task):
-            return [int(x) for x in task.id.split(".")]
 
-        task_models.sort(key=hierarchical_key)
+def rebuild_similarity_index():
+    """Rebuild the trigram index from scratch"""
+    db = get_db()
+    try:
+        connection = db.connection()
+        connection.execute(TaskTrigram.__table__.delete())
+        rows = [
+            row
+            for task_id, title, description in db.query(
+                Task.id, Task.title, Task.description
+            )
+            for row in _trigram_rows(task_id, title, description)
+        ]
+        if rows:
+            connection.execute(TaskTrigram.__table__.insert(), rows)
+        db.commit()
+        logger.debug("Similarity index rebuilt")
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
 
-        return task_models
+
+def ensure_indexes():
+    """Create any missing indexes, which load_database drops along with the
+    tables it replaces from the export"""
+    engine = get_engine()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def ensure_similarity_index():
+    """Build the trigram index if tasks exist but have never been indexed"""
+    db = get_db()
+    try:
+        indexed = db.query(TaskTrigram.task_id).first() is not None
+        has_tasks = db.query(Task.id).first() is not None
+    finally:
+        db.close()
+
+    if has_tasks and not indexed:
+        rebuild_similarity_index()
+
+
+def hierarchical_key(task: TaskModel | PartialTask) -> list[int]:
+    """Sort key ordering tasks hierarchically by their ID"""
+    return [int(x) for x in task.id.split(".")]
+
+
+def hierarchical_sort_key(hierarchical_id: str) -> str:
+    """String sort key ordering hierarchical IDs like hierarchical_key, for use
+    in SQL through the hierarchical_sort_key() function"""
+    return ".".join(f"{int(x):010d}" for x in hierarchical_id.split("."))
+
+
+def register_sql_functions(dbapi_connection, connection_record):
+    """Register taskhelper's SQL functions on a new SQLite connection"""
+    dbapi_connection.create_function(
+        "hierarchical_sort_key", 1, hierarchical_sort_key, deterministic=True
+    )
+
+
+def _task_criteria(statuses: list[Status] | None, parent_id: str | None) -> list:
+    """Build the filters shared by list_tasks and iter_tasks"""
+    if statuses is None:
+        statuses = ["todo", "inprogress"]
+
+    criteria = []
+    if statuses:
+        criteria.append(Task.status.in_(statuses))
+    if parent_id is not None:
+        criteria.append(Task.parent_hierarchical_id == parent_id)
+    return criteria
+
+
+def iter_tasks(
+    statuses: list[Status] | None = None,
+    parent_id: str | None = None,
+    fields: list[TaskField] | None = None,
+    batch_size: int = 500,
+) -> Iterator[TaskModel] | Iterator[PartialTask]:
+    """Yield tasks like list_tasks, ordered hierarchically by SQLite and
+    fetched from the cursor batch_size rows at a time"""
+    criteria = _task_criteria(statuses, parent_id)
+    order = func.hierarchical_sort_key(Task.hierarchical_id)
+
+    db = get_db()
+    try:
+        if fields is not None:
+            columns = task_fields(fields)
+            query = db.query(*(TASK_FIELD_COLUMNS[field] for field in columns))
+            for row in query.filter(*criteria).order_by(order).yield_per(batch_size):
+                yield PartialTask(**dict(zip(columns, row, strict=True)))
+        else:
+            query = db.query(Task).filter(*criteria).order_by(order)
+            for task in query.yield_per(batch_size):
+                yield TaskModel.from_db(task)
     finally:
         db.close()
 
 
-def update_task(task_id: str, task_update: TaskUpdate) -> TaskModel | None:
-    """Update a task by ID using Pydantic model and return the updated Task"""
+def list_tasks(
+    statuses: list[Status] | None = None,
+    parent_id: str | None = None,
+    fields: list[TaskField] | None = None,
+) -> list[TaskModel] | list[PartialTask]:
+    """List all tasks, optionally filtered by statuses or parent_id, ordered hierarchically
+
+    If fields is given only those fields (and id) are read and returned.
+    """
+    return [*iter_tasks(statuses, parent_id, fields)]
+
+
+@export_lock()
+def update_task(
+    task_id: str, task_update: TaskUpdate, expected_version: int | None = None
+) -> TaskModel | None:
+    """Update a task by ID using Pydantic model and return the updated Task
+
+    If expected_version is given the update only applies when the stored task
+    is still at that version, otherwise TaskConflictError is raised.
+    """
     db = get_db()
     try:
         task = db.query(Task).filter(Task.hierarchical_id == task_id).first()
         if not task:
             return None
+        if expected_version is not None and task.version != expected_version:
+            raise TaskConflictError(task_id, expected_version, task.version)
 
         if task_update.title is not None:
             task.title = task_update.title
@@ -205,62 +812,940 @@ def update_task(task_id: str, task_update: TaskUpdate) -> TaskModel | None:
             task.parent_hierarchical_id = task_update.parent_id
 
         task.updated_at = datetime.now(timezone.utc)
+        db.flush()
+        record_change(db, "update", TaskModel.from_db(task))
         db.commit()
         db.refresh(task)
         dump_database()
 
         return TaskModel.from_db(task)
+    except StaleDataError:
+        db.rollback()
+        raise TaskConflictError(task_id, expected_version, None)
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+@export_lock()
+def import_tasks(tasks: Iterable[TaskImport], batch_size: int = 500) -> ImportResult:
+    """Insert many tasks in a single transaction and export once
+
+    Hierarchical IDs are allocated in memory from one sibling lookup per
+    parent, and rows are inserted batch_size at a time along with their change
+    log and similarity index entries. A task's parent is the earlier task whose
+    ref matches its parent, else its parent_id, else it becomes a root task.
+    """
+    started = time.perf_counter()
+    imported = 0
+    # Next child position for each parent seen so far, None for root tasks
+    next_positions: dict[str | None, int] = {}
+    refs: dict[str, str] = {}
+
+    load_archive()
+
+    db = get_db()
+    try:
+        connection = db.connection()
+
+        def allocate_id(parent_id: str | None) -> str:
+            if parent_id not in next_positions:
+                if (
+                    parent_id is not None
+                    and not db.query(Task.id)
+                    .filter(Task.hierarchical_id == parent_id)
+                    .first()
+                ):
+                    raise ValueError(f"Parent task {parent_id} not found")
+                next_positions[parent_id] = _next_position(connection, parent_id)
+
+            position = next_positions[parent_id]
+            next_positions[parent_id] += 1
+            task_id = f"{parent_id}.{position}" if parent_id else str(position)
+            next_positions[task_id] = 1
+            return task_id
+
+        def insert_batch(batch: list[TaskModel]):
+            inserted_ids = connection.scalars(
+                Task.__table__.insert().returning(
+                    Task.__table__.c.id, sort_by_parameter_order=True
+                ),
+                [
+                    {
+                        "hierarchical_id": task.id,
+                        "title": task.title,
+                        "description": task.description,
+                        "status": task.status,
+                        "priority": task.priority,
+                        "complexity": task.complexity,
+                        "created_at": task.created_at,
+                        "updated_at": task.updated_at,
+                        "parent_hierarchical_id": task.parent_id,
+                        "version": task.version,
+                    }
+                    for task in batch
+                ],
+            ).all()
+            connection.execute(
+                TaskChange.__table__.insert(),
+                [
+                    {
+                        "task_id": task.id,
+                        "operation": "create",
+                        "imported": False,
+                        "task": task.model_dump_json(),
+                    }
+                    for task in batch
+                ],
+            )
+            trigram_rows = [
+                row
+                for row_id, task in zip(inserted_ids, batch, strict=True)
+                for row in _trigram_rows(row_id, task.title, task.description)
+            ]
+            if trigram_rows:
+                connection.execute(TaskTrigram.__table__.insert(), trigram_rows)
+
+        batch: list[TaskModel] = []
+        for task_import in tasks:
+            if task_import.parent is not None:
+                if task_import.parent not in refs:
+                    raise ValueError(f"Unknown parent reference {task_import.parent}")
+                parent_id = refs[task_import.parent]
+            else:
+                parent_id = task_import.parent_id
+
+            now = datetime.now(timezone.utc)
+            task = TaskModel(
+                id=allocate_id(parent_id),
+                title=task_import.title,
+                description=task_import.description,
+                status=task_import.status,
+                priority=task_import.priority,
+                complexity=task_import.complexity,
+                parent_id=parent_id,
+                created_at=now,
+                updated_at=now,
+                version=1,
+            )
+            if task_import.ref is not None:
+                refs[task_import.ref] = task.id
+
+            batch.append(task)
+            if len(batch) >= batch_size:
+                insert_batch(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            insert_batch(batch)
+            imported += len(batch)
+
+        db.commit()
     except Exception as e:
         db.rollback()
         raise e
     finally:
         db.close()
 
+    if imported:
+        dump_database()
+
+    return ImportResult(imported=imported, seconds=time.perf_counter() - started)
+
+
+def _subtree_ids(task_id: str, include_self: bool = True, model=Task):
+    """Select the hierarchical IDs of a task's descendants, and the task itself
+    if include_self, following parent links rather than ID prefixes, which no
+    longer match the tree once tasks are moved or their parent is deleted
+
+    model is Task or ArchivedTask, whose rows keep their parent links.
+    """
+    subtree = (
+        select(model.hierarchical_id)
+        .where(model.hierarchical_id == task_id)
+        .cte("subtree", recursive=True)
+    )
+    child = aliased(model)
+    # UNION rather than UNION ALL stops at parent cycles
+    subtree = subtree.union(
+        select(child.hierarchical_id).where(
+            child.parent_hierarchical_id == subtree.c.hierarchical_id
+        )
+    )
+    query = select(subtree.c.hierarchical_id)
+    if not include_self:
+        query = query.where(subtree.c.hierarchical_id != task_id)
+    return query
+
 
-def delete_task(task_id: str) -> TaskModel | None:
-    """Delete a task by ID and return the deleted task"""
+@export_lock()
+def set_subtree_status(
+    task_id: str,
+    status: Status,
+    include_self: bool = True,
+    fields: list[TaskField] | None = None,
+) -> list[TaskModel] | list[PartialTask] | None:
+    """Set the status of all descendants of a task, and the task itself if
+    include_self, in a single UPDATE that walks the parent links with a
+    recursive CTE. Returns the tasks that changed, limited to
+    the given fields if any.
+
+    Unlike get_task and list_tasks, fields does not narrow the SQL: every
+    changed task is recorded whole in the change log, so full rows are
+    returned by the UPDATE and only trimmed afterwards.
+    """
+    db = get_db()
+    try:
+        if db.query(Task.id).filter(Task.hierarchical_id == task_id).first() is None:
+            return None
+
+        tasks = db.scalars(
+            update(Task)
+            .where(
+                Task.hierarchical_id.in_(_subtree_ids(task_id, include_self)),
+                Task.status != status,
+            )
+            .values(
+                status=status,
+                version=Task.version + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(Task)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        task_models = [TaskModel.from_db(task) for task in tasks]
+        task_models.sort(key=hierarchical_key)
+        for task_model in task_models:
+            record_change(db, "update", task_model)
+        db.commit()
+
+        if task_models:
+            dump_database()
+
+        if fields is not None:
+            # The change log above needs the full rows, so project in Python
+            return [PartialTask.project(task, fields) for task in task_models]
+        return task_models
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+@export_lock()
+def delete_task(task_id: str, expected_version: int | None = None) -> TaskModel | None:
+    """Delete a task by ID and return the deleted task
+
+    If expected_version is given the delete only applies when the stored task
+    is still at that version, otherwise TaskConflictError is raised.
+    """
     db = get_db()
     try:
         task = db.query(Task).filter(Task.hierarchical_id == task_id).first()
         if not task:
             return None
+        if expected_version is not None and task.version != expected_version:
+            raise TaskConflictError(task_id, expected_version, task.version)
 
         deleted_task = TaskModel.from_db(task)
+        orphaned_tasks = (
+            db.query(Task).filter(Task.parent_hierarchical_id == task_id).all()
+        )
 
+        db.query(TaskDependency).filter(
+            or_(
+                TaskDependency.task_id == task_id,
+                TaskDependency.blocked_by_id == task_id,
+            )
+        ).delete(synchronize_session=False)
         db.delete(task)
+        db.flush()
+        record_change(db, "delete", deleted_task)
+        for child in orphaned_tasks:
+            record_change(db, "update", TaskModel.from_db(child))
         db.commit()
         dump_database()
         return deleted_task
+    except StaleDataError:
+        db.rollback()
+        raise TaskConflictError(task_id, expected_version, None)
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def _depends_on(db: Session, task_id: str, blocked_by_id: str) -> bool:
+    """Whether task_id is blocked, directly or transitively, by blocked_by_id
+
+    Only the tasks upstream of task_id are walked, following the primary key
+    of task_dependencies.
+    """
+    return (
+        db.execute(
+            text(
+                "WITH RECURSIVE upstream(id) AS ("
+                " SELECT :task_id"
+                " UNION"
+                " SELECT d.blocked_by_id FROM task_dependencies d"
+                " JOIN upstream u ON d.task_id = u.id"
+                ") SELECT 1 FROM upstream WHERE id = :blocked_by_id LIMIT 1"
+            ),
+            {"task_id": task_id, "blocked_by_id": blocked_by_id},
+        ).first()
+        is not None
+    )
+
+
+@export_lock()
+def add_dependency(task_id: str, blocked_by_id: str) -> TaskDependencyModel | None:
+    """Record that task_id is blocked by blocked_by_id and return the edge
+
+    Returns None if either task does not exist. Raises DependencyCycleError if
+    blocked_by_id already depends on task_id, or is task_id itself.
+    """
+    db = get_db()
+    try:
+        found = (
+            db.query(func.count(Task.id))
+            .filter(Task.hierarchical_id.in_([task_id, blocked_by_id]))
+            .scalar()
+        )
+        if found < len({task_id, blocked_by_id}):
+            return None
+        if _depends_on(db, blocked_by_id, task_id):
+            raise DependencyCycleError(task_id, blocked_by_id)
+
+        dependency = TaskDependencyModel(task_id=task_id, blocked_by_id=blocked_by_id)
+        if db.get(TaskDependency, (task_id, blocked_by_id)) is not None:
+            return dependency
+
+        db.add(TaskDependency(task_id=task_id, blocked_by_id=blocked_by_id))
+        db.commit()
+        dump_database()
+        return dependency
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+@export_lock()
+def remove_dependency(task_id: str, blocked_by_id: str) -> TaskDependencyModel | None:
+    """Remove the edge blocking task_id on blocked_by_id and return it"""
+    db = get_db()
+    try:
+        removed = (
+            db.query(TaskDependency)
+            .filter(
+                TaskDependency.task_id == task_id,
+                TaskDependency.blocked_by_id == blocked_by_id,
+            )
+            .delete(synchronize_session=False)
+        )
+        if not removed:
+            return None
+        db.commit()
+        dump_database()
+        return TaskDependencyModel(task_id=task_id, blocked_by_id=blocked_by_id)
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def list_dependencies(task_id: str | None = None) -> list[TaskDependencyModel]:
+    """List dependency edges, optionally only those of tasks blocking task_id"""
+    db = get_db()
+    try:
+        query = db.query(TaskDependency)
+        if task_id is not None:
+            query = query.filter(TaskDependency.task_id == task_id)
+        order = (
+            func.hierarchical_sort_key(TaskDependency.task_id),
+            func.hierarchical_sort_key(TaskDependency.blocked_by_id),
+        )
+        return [
+            TaskDependencyModel(
+                task_id=dependency.task_id, blocked_by_id=dependency.blocked_by_id
+            )
+            for dependency in query.order_by(*order)
+        ]
+    finally:
+        db.close()
+
+
+def next_tasks(limit: int = 10, parent_id: str | None = None) -> list[TaskModel]:
+    """List todo tasks that no unfinished task blocks, highest priority and
+    lowest complexity first, optionally only within the subtree of parent_id
+
+    Unlike list_tasks, parent_id selects all descendants of the task, found by
+    following parent links rather than by ID prefix so moved tasks are found.
+    A task is ready when none of its direct blockers is open; blockers that are
+    themselves blocked are open too, so no walk of the graph is needed.
+    """
+    blocker = aliased(Task)
+    blocked = exists().where(
+        TaskDependency.task_id == Task.hierarchical_id,
+        blocker.hierarchical_id == TaskDependency.blocked_by_id,
+        blocker.status != "done",
+    )
+    criteria = [Task.status == "todo", ~blocked]
+    if parent_id is not None:
+        criteria.append(
+            Task.hierarchical_id.in_(_subtree_ids(parent_id, include_self=False))
+        )
+
+    db = get_db()
+    try:
+        query = (
+            db.query(Task)
+            .filter(*criteria)
+            .order_by(
+                case({"high": 0, "medium": 1}, value=Task.priority, else_=2),
+                case({"low": 0, "medium": 1}, value=Task.complexity, else_=2),
+                func.hierarchical_sort_key(Task.hierarchical_id),
+            )
+            .limit(limit)
+        )
+        return [TaskModel.from_db(task) for task in query]
+    finally:
+        db.close()
+
+
+@export_lock()
+def archive_tasks(
+    task_id: str | None = None, older_than_days: float | None = None
+) -> list[TaskModel] | None:
+    """Move completed subtrees out of the tasks table and main export into the
+    archive, returning the root task of each archived subtree
+
+    A subtree is archived when all of its tasks are done and, if
+    older_than_days is given, were last updated at least that many days ago.
+    If task_id is given only its subtree is considered, and ValueError is
+    raised unless all of it can be archived. Returns None if task_id does not
+    exist.
+    """
+    load_archive()
+
+    db = get_db()
+    try:
+        query = db.query(
+            Task.hierarchical_id,
+            Task.parent_hierarchical_id,
+            Task.status,
+            Task.updated_at,
+        )
+        if task_id is not None:
+            query = query.filter(Task.hierarchical_id.in_(_subtree_ids(task_id)))
+        rows = query.all()
+        if task_id is not None and not any(
+            row.hierarchical_id == task_id for row in rows
+        ):
+            return None
+
+        cutoff = None
+        if older_than_days is not None:
+            # SQLite hands back the stored UTC timestamps without a timezone
+            cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+                days=older_than_days
+            )
+
+        parents = {row.hierarchical_id: row.parent_hierarchical_id for row in rows}
+        archivable = {
+            row.hierarchical_id: row.status == "done"
+            and (
+                cutoff is None
+                or (row.updated_at is not None and row.updated_at <= cutoff)
+            )
+            for row in rows
+        }
+        # Settle tasks bottom-up through the parent links, as the IDs of moved
+        # tasks no longer tell their depth: a parent is settled once all of its
+        # children are, and is archivable only if they all are
+        unsettled_children = Counter(
+            parent_id for parent_id in parents.values() if parent_id in parents
+        )
+        settled = [key for key in parents if not unsettled_children[key]]
+        for hierarchical_id in settled:
+            parent_id = parents[hierarchical_id]
+            if parent_id not in parents:
+                continue
+            if not archivable[hierarchical_id]:
+                archivable[parent_id] = False
+            unsettled_children[parent_id] -= 1
+            if not unsettled_children[parent_id]:
+                settled.append(parent_id)
+        # Tasks in a parent cycle never settle and stay where they are
+        for hierarchical_id in parents.keys() - set(settled):
+            archivable[hierarchical_id] = False
+
+        if task_id is not None and not archivable[task_id]:
+            raise ValueError(
+                f"Task {task_id} has tasks that are not done"
+                + (f" for {older_than_days} days" if cutoff is not None else "")
+            )
+
+        archived_ids = sorted(
+            (key for key, value in archivable.items() if value),
+            key=hierarchical_sort_key,
+        )
+        root_ids = {
+            key
+            for key in archived_ids
+            if key == task_id or not archivable.get(parents[key], False)
+        }
+
+        connection = db.connection()
+        archived_at = datetime.now(timezone.utc)
+        roots: list[TaskModel] = []
+        for start in range(0, len(archived_ids), 500):
+            chunk = archived_ids[start : start + 500]
+            task_rows = [
+                dict(row)
+                for row in connection.execute(
+                    select(Task.__table__).where(Task.hierarchical_id.in_(chunk))
+                ).mappings()
+            ]
+            task_models = [_task_from_row(row) for row in task_rows]
+            roots.extend(task for task in task_models if task.id in root_ids)
+
+            connection.execute(
+                ArchivedTask.__table__.insert(),
+                [
+                    {
+                        column.name: row[column.name]
+                        for column in ArchivedTask.__table__.columns
+                        if column.name != "archived_at"
+                    }
+                    | {"archived_at": archived_at}
+                    for row in task_rows
+                ],
+            )
+            # Core statements bypass the ORM events that maintain the index
+            connection.execute(
+                TaskTrigram.__table__.delete().where(
+                    TaskTrigram.task_id.in_([row["id"] for row in task_rows])
+                )
+            )
+            connection.execute(
+                TaskDependency.__table__.delete().where(
+                    or_(
+                        TaskDependency.task_id.in_(chunk),
+                        TaskDependency.blocked_by_id.in_(chunk),
+                    )
+                )
+            )
+            connection.execute(
+                Task.__table__.delete().where(Task.hierarchical_id.in_(chunk))
+            )
+            connection.execute(
+                TaskChange.__table__.insert(),
+                [
+                    {
+                        "task_id": task.id,
+                        "operation": "archive",
+                        "imported": False,
+                        "task": task.model_dump_json(),
+                    }
+                    for task in task_models
+                ],
+            )
+        db.commit()
     except Exception as e:
         db.rollback()
         raise e
     finally:
         db.close()
 
+    if roots:
+        # Write the archive first so an interrupted export never loses tasks
+        dump_archive()
+        dump_database()
+        logger.debug(f"Archived {len(archived_ids)} tasks")
+
+    roots.sort(key=hierarchical_key)
+    return roots
+
+
+def list_archived_tasks(task_id: str | None = None) -> list[TaskModel]:
+    """List archived tasks, optionally only the subtree of task_id, loading the
+    archive export first if it changed"""
+    load_archive()
+
+    db = get_db()
+    try:
+        query = db.query(ArchivedTask)
+        if task_id is not None:
+            query = query.filter(
+                ArchivedTask.hierarchical_id.in_(
+                    _subtree_ids(task_id, model=ArchivedTask)
+                )
+            )
+        query = query.order_by(func.hierarchical_sort_key(ArchivedTask.hierarchical_id))
+        return [TaskModel.from_db(task) for task in query]
+    finally:
+        db.close()
+
+
+def record_change(
+    db: Session, operation: ChangeOperation, task: TaskModel, imported: bool = False
+):
+    """Append a change to the change log in the session's transaction"""
+    db.add(
+        TaskChange(
+            task_id=task.id,
+            operation=operation,
+            imported=imported,
+            task=task.model_dump_json(),
+        )
+    )
+
+
+def changes_since(seq: int = 0, limit: int = 100) -> ChangeFeed:
+    """Get changes recorded after seq, oldest first
+
+    reset is set when entries after seq have been compacted away, in which
+    case the caller should resync with list_tasks before following the feed.
+    """
+    db = get_db()
+    try:
+        oldest_seq = db.query(func.min(TaskChange.seq)).scalar()
+        rows = (
+            db.query(TaskChange)
+            .filter(TaskChange.seq > seq)
+            .order_by(TaskChange.seq)
+            .limit(limit + 1)
+            .all()
+        )
+
+        changes = [TaskChangeModel.from_db(row) for row in rows[:limit]]
+        return ChangeFeed(
+            changes=changes,
+            last_seq=changes[-1].seq if changes else seq,
+            has_more=len(rows) > limit,
+            reset=oldest_seq is not None and seq < oldest_seq - 1,
+        )
+    finally:
+        db.close()
+
+
+def compact_changes(keep: int | None = None) -> int:
+    """Delete all but the newest keep change log entries and return how many were removed"""
+    if keep is None:
+        keep = get_settings().change_log_size
+    # Keep at least one entry so sequence numbers are never reused
+    keep = max(keep, 1)
+
+    db = get_db()
+    try:
+        cutoff = (
+            db.query(TaskChange.seq)
+            .order_by(TaskChange.seq.desc())
+            .offset(keep)
+            .limit(1)
+            .scalar()
+        )
+        if cutoff is None:
+            return 0
+
+        removed = (
+            db.query(TaskChange)
+            .filter(TaskChange.seq <= cutoff)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        logger.debug(f"Compacted {removed} change log entries")
+        return removed
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def compact_grown_changes() -> int:
+    """Compact the change log once it holds a tenth more entries than
+    --change-log-size, so long-running servers keep it in bounds without a
+    restart while most writes skip the delete"""
+    keep = get_settings().change_log_size
+    db = get_db()
+    try:
+        oldest, newest = db.query(
+            func.min(TaskChange.seq), func.max(TaskChange.seq)
+        ).one()
+    finally:
+        db.close()
+
+    # Sequence numbers have no gaps as compaction only removes the oldest
+    if oldest is None or newest - oldest + 1 <= keep + max(keep // 10, 1):
+        return 0
+    return compact_changes(keep)
+
+
+def _task_rows() -> dict[str, dict]:
+    """Read raw task rows keyed by hierarchical_id, whatever the table schema"""
+    with get_engine().connect() as connection:
+        rows = connection.execute(text("SELECT * FROM tasks")).mappings()
+        return {row["hierarchical_id"]: dict(row) for row in rows}
+
+
+def _task_from_row(row: dict) -> TaskModel:
+    return TaskModel(
+        id=row["hierarchical_id"],
+        title=row["title"],
+        description=row["description"],
+        status=row["status"],
+        priority=row["priority"],
+        complexity=row["complexity"],
+        parent_id=row["parent_hierarchical_id"],
+        created_at=row["created_at"],
+        updated_at=row["updated_at"],
+        version=row.get("version"),
+    )
+
+
+def sync_imported_changes(before: dict[str, dict], after: dict[str, dict]):
+    """Record the differences between two task snapshots in the change log and
+    similarity index"""
+    db = get_db()
+    try:
+        connection = db.connection()
+        for task_id in before.keys() - after.keys():
+            record_change(db, "delete", _task_from_row(before[task_id]), imported=True)
+            _unindex_task(connection, before[task_id]["id"])
+        for task_id, row in after.items():
+            previous = before.get(task_id)
+            if previous is None:
+                operation = "create"
+            elif any(previous[key] != row[key] for key in previous.keys() & row.keys()):
+                operation = "update"
+            else:
+                continue
+            record_change(db, operation, _task_from_row(row), imported=True)
+            if previous is not None and previous["id"] != row["id"]:
+                _unindex_task(connection, previous["id"])
+            _index_task(connection, row["id"], row["title"], row["description"])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def _export_database() -> str | sqlite3.Connection:
+    """Get what the diffable file helpers should open for the current root:
+    the database file, or the shared connection of an in-memory database"""
+    connection = _get_root_engine().connection
+    return connection if connection is not None else get_db_path()
+
 
 def load_database():
     """Load database from diffable files"""
-    settings = get_settings()
-    tasks_folder = os.path.join(settings.root, settings.tasks_path)
-    db_path = os.path.join(settings.root, settings.db_path)
+    tasks_folder = get_tasks_path()
 
     if os.path.exists(tasks_folder):
         logger.debug(f"Loading database from diffable files: {tasks_folder}")
-        diff_load_database(db_path, tasks_folder, replace=True)
+        before = _task_rows()
+        database = _export_database()
+        with export_lock(), timed("export"):
+            diff_load_database(database, tasks_folder, replace=True)
+        sync_imported_changes(before, _task_rows())
         logger.debug("Database loaded successfully")
 
 
+def get_archive_path() -> str:
+    """Get the folder holding the archive export for the current root"""
+    return os.path.join(get_tasks_path(), "archive")
+
+
+def _archive_export_mtime() -> int | None:
+    path = os.path.join(get_archive_path(), f"{ArchivedTask.__tablename__}.ndjson")
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _set_archive_export_mtime(mtime: int | None):
+    db = get_db()
+    try:
+        db.merge(ArchiveState(id=1, export_mtime_ns=mtime))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def load_archive():
+    """Load the archive export into the database, unless it is unchanged since
+    it was last loaded or written
+
+    The archive is kept out of load_database so that startup only reads it
+    when its export changed; this is also called by the operations that need
+    archived tasks.
+    """
+    db = get_db()
+    try:
+        state = db.get(ArchiveState, 1)
+        loaded_mtime = state.export_mtime_ns if state else None
+    finally:
+        db.close()
+
+    database = _export_database()
+    with export_lock(), timed("export"):
+        mtime = _archive_export_mtime()
+        if mtime is None or mtime == loaded_mtime:
+            return
+        logger.debug(f"Loading archive from diffable files: {get_archive_path()}")
+        diff_load_database(database, get_archive_path(), replace=True)
+    _set_archive_export_mtime(mtime)
+
+
+def dump_archive():
+    """Dump archived tasks to the archive folder of the diffable files"""
+    os.makedirs(get_tasks_path(), exist_ok=True)
+    database = _export_database()
+    with export_lock(), timed("export"):
+        diff_dump_database(database, get_archive_path(), tables=ARCHIVE_TABLES)
+        mtime = _archive_export_mtime()
+    _set_archive_export_mtime(mtime)
+
+
+def settle_archive():
+    """Settle tasks that are both active and archived, which archive_tasks
+    leaves behind when it is interrupted after writing the archive export but
+    before the main one
+
+    Archiving keeps a task's version, so the archived copy wins unless the
+    active one was changed since. The exports are rewritten to match.
+    """
+    archived = exists().where(
+        ArchivedTask.hierarchical_id == Task.hierarchical_id,
+        ArchivedTask.version >= Task.version,
+    )
+    db = get_db()
+    try:
+        connection = db.connection()
+        removed = {
+            row["hierarchical_id"]: dict(row)
+            for row in connection.execute(
+                select(Task.__table__).where(archived)
+            ).mappings()
+        }
+        if removed:
+            archived_ids = select(Task.hierarchical_id).where(archived)
+            connection.execute(
+                TaskDependency.__table__.delete().where(
+                    or_(
+                        TaskDependency.task_id.in_(archived_ids),
+                        TaskDependency.blocked_by_id.in_(archived_ids),
+                    )
+                )
+            )
+            connection.execute(Task.__table__.delete().where(archived))
+        unarchived = connection.execute(
+            ArchivedTask.__table__.delete().where(
+                exists().where(
+                    Task.hierarchical_id == ArchivedTask.hierarchical_id,
+                    Task.version > ArchivedTask.version,
+                )
+            )
+        ).rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+    if removed:
+        sync_imported_changes(removed, {})
+        logger.info(f"Removed {len(removed)} archived task(s) left among active tasks")
+    if unarchived:
+        dump_archive()
+    if removed:
+        dump_database()
+
+
 def dump_database():
-    """Dump database to diffable files"""
-    settings = get_settings()
-    tasks_folder = os.path.join(settings.root, settings.tasks_path)
-    db_path = os.path.join(settings.root, settings.db_path)
+    """Dump database to diffable files after a write
+
+    In-memory databases are only marked as changed, and snapshotted when
+    --snapshot-interval seconds have passed since their last snapshot. As every
+    write ends here, this is also where the change log is kept in bounds.
+    """
+    compact_grown_changes()
+    entry = _get_root_engine()
+    if entry.connection is None:
+        _dump_database(get_db_path())
+        return
+
+    entry.dirty = True
+    if time.monotonic() - entry.last_snapshot >= get_settings().snapshot_interval:
+        _snapshot(current_root(), entry)
+
+
+def _dump_database(database: str | sqlite3.Connection):
+    tasks_folder = get_tasks_path()
 
     logger.debug(f"Dumping database to diffable files: {tasks_folder}")
-    diff_dump_database(db_path, tasks_folder, dump_all=True)
+    with export_lock(), timed("export"):
+        diff_dump_database(
+            database,
+            tasks_folder,
+            dump_all=True,
+            exclude=LOCAL_TABLES + ARCHIVE_TABLES,
+        )
     logger.debug("Database dumped successfully")
 
 
+def snapshot_database():
+    """Write the current root's database to the diffable files and, if it is
+    held in memory, back it up to the database file"""
+    _snapshot(current_root(), _get_root_engine())
+
+
+def _snapshot(root: str, entry: _RootEngine):
+    """Snapshot a root's database without going through the engine pool, so it
+    can be used while engines are being evicted"""
+    token = _root_override.set(root)
+    try:
+        if entry.connection is None:
+            _dump_database(get_db_path())
+            return
+
+        _dump_database(entry.connection)
+        db_path = get_db_path()
+        logger.debug(f"Backing up in-memory database to: {db_path}")
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(db_path), prefix=f".{os.path.basename(db_path)}."
+        )
+        os.close(fd)
+        try:
+            with export_lock(), timed("export"):
+                with closing(sqlite3.connect(tmp_path)) as target:
+                    entry.connection.backup(target)
+                os.replace(tmp_path, db_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        entry.dirty = False
+        entry.last_snapshot = time.monotonic()
+    finally:
+        _root_override.reset(token)
+
+
 def apply_migrations():
     """Apply Alembic migrations automatically"""
     taskhelper_dir_path = os.path.dirname(os.path.abspath(__file__))
@@ -269,14 +1754,32 @@ def apply_migrations():
 
     config = alembic.config.Config(alembic_ini_path)
     config.set_main_option("script_location", alembic_dir_path)
+    config.set_main_option(
+        "sqlalchemy.url", f"sqlite:///{get_db_path()}".replace("%", "%%")
+    )
 
-    alembic.command.upgrade(config, "head")
+    entry = _get_root_engine()
+    if entry.connection is not None:
+        with entry.engine.begin() as connection:
+            config.attributes["connection"] = connection
+            alembic.command.upgrade(config, "head")
+    else:
+        alembic.command.upgrade(config, "head")
     logger.debug("Database migrations applied successfully")
     return True
 
 
 def init_db_with_data():
-    """Initialize the database and load from files if they exist"""
+    """Initialize the database for the current root and load from files if they exist"""
     init_db()
-    apply_migrations()
     load_database()
+    apply_migrations()
+    ensure_indexes()
+    load_archive()
+    settle_archive()
+    compact_changes()
+    ensure_similarity_index()
+
+    archive_after_days = get_settings().archive_after_days
+    if archive_after_days is not None:
+        archive_tasks(older_than_days=archive_after_days)
@@ -2,13 +2,33 @@
 
 # type: ignore
 
+import contextlib
 import json
+import os
 import pathlib
+import tempfile
 import sqlite_utils
 import sqlite3
 from typing import List, Optional, Union
 
 
+@contextlib.contextmanager
+def _atomic_write(path: pathlib.Path):
+    """
+    Write a file through a temporary file in the same directory, renaming it
+    over the destination only once it has been written completely.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            yield fp
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
 def dump_database(
     dbpath: Union[str, pathlib.Path],
     output_dir: Union[str, pathlib.Path],
@@ -48,7 +68,7 @@ def dump_database(
         filepath = output / f"{tablename}.ndjson"
         metapath = output / f"{tablename}.metadata.json"
 
-        with filepath.open("w") as fp:
+        with _atomic_write(filepath) as fp:
             for row in conn[table].rows:
                 fp.write(json.dumps(list(row.values()), default=repr) + "\n")
 
@@ -58,7 +78,7 @@ def dump_database(
             "schema": conn[table].schema,
         }
 
-        with metapath.open("w") as fp:
+        with _atomic_write(metapath) as fp:
             fp.write(json.dumps(metadata, indent=4))
 
 
@@ -0,0 +1,113 @@
+import csv
+import json
+import os
+import re
+from typing import Any, Iterable, Iterator, Literal, TextIO
+
+from pydantic import ValidationError
+
+from .task import TaskImport
+
+ImportFormat = Literal["ndjson", "csv", "tsv", "markdown"]
+
+IMPORT_FORMATS: list[ImportFormat] = ["ndjson", "csv", "tsv", "markdown"]
+
+_EXTENSION_FORMATS: dict[str, ImportFormat] = {
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".md": "markdown",
+    ".markdown": "markdown",
+}
+
+_CHECKLIST_RE = re.compile(
+    r"^(?P<indent>[ \t]*)[-*+] \[(?P<mark>[ xX])\] (?P<title>.+)$"
+)
+
+
+def detect_format(path: str) -> ImportFormat:
+    """Guess the import format from a file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _EXTENSION_FORMATS:
+        raise ValueError(f"Cannot detect the import format of {path}")
+    return _EXTENSION_FORMATS[extension]
+
+
+def read_tasks(
+    fp: TextIO, input_format: ImportFormat, defaults: dict[str, Any]
+) -> Iterator[TaskImport]:
+    """Stream tasks from a file, filling missing fields from defaults
+
+    Records may set ref to name themselves and parent to the ref of an earlier
+    record, or parent_id to an existing task. Markdown checklists nest items by
+    indentation instead. ValueError is raised, naming the line, for records
+    with fields that are not task fields, ndjson lines that are not JSON
+    objects or CSV/TSV rows with more values than the header.
+    """
+    records: Iterable[tuple[int, dict[str, Any]]]
+    if input_format == "ndjson":
+        records = _read_ndjson(fp)
+    elif input_format in ("csv", "tsv"):
+        delimiter = "\t" if input_format == "tsv" else ","
+        records = _read_rows(csv.DictReader(fp, delimiter=delimiter))
+    else:
+        records = _read_markdown(fp)
+
+    for line_number, record in records:
+        unknown = record.keys() - TaskImport.model_fields.keys()
+        if unknown:
+            raise ValueError(
+                f"Line {line_number}: unknown fields {', '.join(sorted(unknown))}"
+            )
+        try:
+            yield TaskImport(**{**defaults, **record})
+        except ValidationError as e:
+            raise ValueError(f"Line {line_number}: {e}") from e
+
+
+def _read_ndjson(fp: TextIO) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Read one JSON object per line, skipping blank lines"""
+    for line_number, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON: {e}") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {line_number}: expected a JSON object")
+        yield line_number, record
+
+
+def _read_rows(reader: csv.DictReader) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Read CSV/TSV rows, leaving out empty values"""
+    for row in reader:
+        # DictReader collects values beyond the header under a None key
+        if None in row:
+            raise ValueError(
+                f"Line {reader.line_num}: more values than the header has columns"
+            )
+        yield reader.line_num, {key: value for key, value in row.items() if value}
+
+
+def _read_markdown(fp: TextIO) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Read checklist items, using indentation to find each item's parent"""
+    stack: list[tuple[int, str]] = []
+    for line_number, line in enumerate(fp, start=1):
+        match = _CHECKLIST_RE.match(line.rstrip("\n"))
+        if not match:
+            continue
+
+        indent = len(match["indent"].expandtabs(4))
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+
+        ref = f"line {line_number}"
+        record: dict[str, Any] = {"ref": ref, "title": match["title"].strip()}
+        if stack:
+            record["parent"] = stack[-1][1]
+        if match["mark"] in "xX":
+            record["status"] = "done"
+        stack.append((indent, ref))
+        yield line_number, record
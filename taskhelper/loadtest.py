@@ -0,0 +1,375 @@
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+import anyio
+import click
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from tabulate import tabulate
+
+READ_TOOLS = ["get_task", "list_tasks"]
+WRITE_TOOLS = ["create_task", "update_task", "delete_task"]
+TOOLS = READ_TOOLS + WRITE_TOOLS
+
+
+@dataclass
+class LoadTestStats:
+    """Latencies in seconds and error counts per tool"""
+
+    latencies: dict[str, list[float]] = field(
+        default_factory=lambda: {tool: [] for tool in TOOLS}
+    )
+    errors: dict[str, int] = field(default_factory=lambda: dict.fromkeys(TOOLS, 0))
+    seconds: float = 0.0
+
+    @property
+    def requests(self) -> int:
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class LoadTestResult:
+    stats: LoadTestStats
+    problems: list[str]
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of values, q between 0 and 100"""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def run_server(root: str, host: str, port: int) -> Iterator[str]:
+    """Start taskhelper-mcp over streamable HTTP for root and yield its URL"""
+    url = f"http://{host}:{port}/mcp"
+    command = [
+        sys.executable,
+        "-m",
+        "taskhelper.mcp",
+        "--transport",
+        "streamable-http",
+        "--root",
+        root,
+        "--host",
+        host,
+        "--port",
+        str(port),
+        "--log-level",
+        "WARNING",
+    ]
+    log_path = os.path.join(root, "server.log")
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if server.poll() is not None:
+                with open(log_path) as log:
+                    raise RuntimeError(f"MCP server exited:\n{log.read()}")
+            try:
+                socket.create_connection((host, port), timeout=0.1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Timed out waiting for the MCP server")
+                time.sleep(0.05)
+        yield url
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def _structured(result) -> Any:
+    data = result.structuredContent
+    return data["result"] if isinstance(data, dict) and "result" in data else data
+
+
+async def _client(
+    url: str,
+    client_id: int,
+    requests: int,
+    read_ratio: float,
+    stats: LoadTestStats,
+    live_tasks: dict[str, str],
+):
+    """Issue requests tool calls, creating, updating and deleting its own tasks
+    and reading those of every client"""
+    rng = random.Random(client_id)
+    own_tasks: list[str] = []
+
+    async with streamablehttp_client(url, timeout=60) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+            for n in range(requests):
+                if rng.random() < read_ratio and live_tasks:
+                    tool = rng.choice(READ_TOOLS)
+                    if tool == "get_task":
+                        arguments = {"task_id": rng.choice([*live_tasks])}
+                    else:
+                        arguments = {"statuses": ["todo", "inprogress", "done"]}
+                elif not own_tasks or rng.random() < 0.4:
+                    tool = "create_task"
+                    arguments = {
+                        "title": f"Client {client_id} task {n}",
+                        "description": f"Created by load test client {client_id}",
+                        "priority": rng.choice(["low", "medium", "high"]),
+                        "complexity": rng.choice(["low", "medium", "high"]),
+                    }
+                elif rng.random() < 0.8:
+                    tool = "update_task"
+                    arguments = {
+                        "task_id": rng.choice(own_tasks),
+                        "status": rng.choice(["todo", "inprogress", "done"]),
+                    }
+                else:
+                    tool = "delete_task"
+                    task_id = own_tasks.pop(rng.randrange(len(own_tasks)))
+                    live_tasks.pop(task_id, None)
+                    arguments = {"task_id": task_id}
+
+                started = time.perf_counter()
+                try:
+                    result = await session.call_tool(tool, arguments)
+                except Exception:
+                    stats.errors[tool] += 1
+                    continue
+                stats.latencies[tool].append(time.perf_counter() - started)
+                if result.isError:
+                    stats.errors[tool] += 1
+                elif tool == "create_task":
+                    task = _structured(result)
+                    own_tasks.append(task["id"])
+                    live_tasks[task["id"]] = task["title"]
+
+
+def _read_export(tasks_path: str, problems: list[str]) -> dict[str, dict]:
+    """Read the exported tasks keyed by ID, noting anything malformed"""
+    metadata_path = os.path.join(tasks_path, "tasks.metadata.json")
+    rows_path = os.path.join(tasks_path, "tasks.ndjson")
+    if not os.path.exists(metadata_path) or not os.path.exists(rows_path):
+        problems.append(f"{tasks_path} has no tasks export")
+        return {}
+
+    with open(metadata_path) as fp:
+        columns = json.load(fp)["columns"]
+
+    tasks: dict[str, dict] = {}
+    with open(rows_path) as fp:
+        for line_number, line in enumerate(fp, start=1):
+            try:
+                values = json.loads(line)
+            except json.JSONDecodeError:
+                problems.append(f"tasks.ndjson line {line_number} is not valid JSON")
+                continue
+            if len(values) != len(columns):
+                problems.append(
+                    f"tasks.ndjson line {line_number} has {len(values)} values "
+                    f"for {len(columns)} columns"
+                )
+                continue
+            row = dict(zip(columns, values))
+            if row["hierarchical_id"] in tasks:
+                problems.append(f"Task {row['hierarchical_id']} is exported twice")
+            tasks[row["hierarchical_id"]] = row
+    return tasks
+
+
+async def check_export(
+    url: str, tasks_path: str, live_tasks: dict[str, str]
+) -> list[str]:
+    """Compare the .tasks/ export with the tasks the server lists and the
+    tasks the clients expect to exist, returning any problems found"""
+    problems: list[str] = []
+
+    leftovers = [name for name in os.listdir(tasks_path) if name.startswith(".")]
+    if leftovers:
+        problems.append(f"Temporary export files left behind: {leftovers}")
+
+    exported = _read_export(tasks_path, problems)
+
+    async with streamablehttp_client(url, timeout=60) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            result = await session.call_tool(
+                "list_tasks", {"statuses": ["todo", "inprogress", "done"]}
+            )
+    listed = {task["id"]: task for task in _structured(result)}
+
+    for task_id in listed.keys() - exported.keys():
+        problems.append(f"Task {task_id} is missing from the export")
+    for task_id in exported.keys() - listed.keys():
+        problems.append(f"Task {task_id} is exported but not listed")
+    for task_id in listed.keys() & exported.keys():
+        row, task = exported[task_id], listed[task_id]
+        if (row["title"], row["status"], row["version"]) != (
+            task["title"],
+            task["status"],
+            task["version"],
+        ):
+            problems.append(f"Task {task_id} differs between export and database")
+    for task_id, title in live_tasks.items():
+        if listed.get(task_id, {}).get("title") != title:
+            problems.append(f"Task {task_id} created by a client was lost")
+
+    for task_id, row in exported.items():
+        parent_id = row["parent_hierarchical_id"]
+        if parent_id is not None and parent_id not in exported:
+            problems.append(f"Task {task_id} has missing parent {parent_id}")
+
+    return problems
+
+
+def run_load_test(
+    clients: int = 8,
+    requests: int = 100,
+    read_ratio: float = 0.8,
+    root: str | None = None,
+    url: str | None = None,
+    tasks_path: str = ".tasks",
+    host: str = "127.0.0.1",
+) -> LoadTestResult:
+    """Drive an MCP server with concurrent clients and check its export
+
+    Unless url is given a server is started for root, or for a temporary
+    directory if root is not given either.
+    """
+    stats = LoadTestStats()
+    # Tasks created and not deleted, shared so clients read each other's tasks
+    live_tasks: dict[str, str] = {}
+
+    async def drive(server_url: str, export_path: str) -> list[str]:
+        started = time.perf_counter()
+        async with anyio.create_task_group() as task_group:
+            for client_id in range(clients):
+                task_group.start_soon(
+                    _client,
+                    server_url,
+                    client_id,
+                    requests,
+                    read_ratio,
+                    stats,
+                    live_tasks,
+                )
+        stats.seconds = time.perf_counter() - started
+        return await check_export(server_url, export_path, live_tasks)
+
+    if url is not None:
+        export_path = os.path.join(root or os.getcwd(), tasks_path)
+        return LoadTestResult(stats, anyio.run(drive, url, export_path))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = root or tmp
+        with run_server(root, host, _free_port(host)) as server_url:
+            problems = anyio.run(drive, server_url, os.path.join(root, tasks_path))
+    return LoadTestResult(stats, problems)
+
+
+@click.command()
+@click.option(
+    "--clients", "-n", type=int, default=8, help="Number of concurrent MCP clients"
+)
+@click.option(
+    "--requests", "-r", type=int, default=100, help="Tool calls made by each client"
+)
+@click.option(
+    "--read-ratio",
+    type=click.FloatRange(0, 1),
+    default=0.8,
+    help="Fraction of calls that are get_task or list_tasks",
+)
+@click.option(
+    "--root",
+    type=click.Path(file_okay=False),
+    help="Project root to serve. Defaults to a temporary directory.",
+)
+@click.option(
+    "--url",
+    help="Test an already running server instead, whose project root is --root",
+)
+def loadtest(
+    clients: int,
+    requests: int,
+    read_ratio: float,
+    root: str | None,
+    url: str | None,
+):
+    """Load test taskhelper-mcp over streamable HTTP with concurrent clients"""
+    try:
+        result = run_load_test(clients, requests, read_ratio, root, url)
+    except httpx.HTTPError as e:
+        click.echo(f"Error connecting to MCP server: {e}", err=True)
+        raise click.Abort()
+
+    stats = result.stats
+    rows = [
+        [
+            tool,
+            len(stats.latencies[tool]),
+            stats.errors[tool],
+            *(percentile(stats.latencies[tool], q) * 1000 for q in (50, 95, 99)),
+        ]
+        for tool in TOOLS
+    ]
+    all_latencies = [
+        latency for latencies in stats.latencies.values() for latency in latencies
+    ]
+    rows.append(
+        [
+            "all",
+            stats.requests,
+            sum(stats.errors.values()),
+            *(percentile(all_latencies, q) * 1000 for q in (50, 95, 99)),
+        ]
+    )
+    click.echo(
+        tabulate(
+            rows,
+            headers=["Tool", "Calls", "Errors", "p50 ms", "p95 ms", "p99 ms"],
+            tablefmt="grid",
+            floatfmt=".1f",
+        )
+    )
+    click.echo(
+        f"{stats.requests} calls from {clients} clients in {stats.seconds:.2f}s "
+        f"({stats.requests_per_second:.0f} calls/s)"
+    )
+
+    if result.problems:
+        for problem in result.problems:
+            click.echo(f"Export inconsistency: {problem}", err=True)
+        sys.exit(1)
+    click.echo("Export is consistent")
+
+
+if __name__ == "__main__":
+    loadtest()
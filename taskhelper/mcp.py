@@ -1,24 +1,83 @@
 import logging
+import os
+from contextlib import contextmanager
+from typing import Any
 
 from mcp.server.fastmcp import FastMCP
 
 from .config import get_settings
+from .profiling import profile_invocation, timed
 from .db import (
     init_db_with_data,
+    open_root,
     create_task as db_create_task,
     get_task as db_get_task,
     list_tasks as db_list_tasks,
     update_task as db_update_task,
     delete_task as db_delete_task,
+    changes_since as db_changes_since,
+    find_similar_tasks as db_find_similar_tasks,
+    set_subtree_status as db_set_subtree_status,
+    add_dependency as db_add_dependency,
+    remove_dependency as db_remove_dependency,
+    list_dependencies as db_list_dependencies,
+    next_tasks as db_next_tasks,
+    archive_tasks as db_archive_tasks,
+    list_archived_tasks as db_list_archived_tasks,
+    snapshot_database as db_snapshot_database,
+)
+from .task import (
+    ChangeFeed,
+    PartialTask,
+    SimilarTask,
+    Task,
+    TaskDependency,
+    TaskField,
+    TaskTable,
+    TaskCreate,
+    TaskUpdate,
+    Status,
+    Priority,
+    Complexity,
 )
-from .task import Task, TaskCreate, TaskUpdate, Status, Priority, Complexity
 
 logging.basicConfig(level=get_settings().log_level)
 logger = logging.getLogger(__name__)
 
-mcp = FastMCP("taskhelper", log_level=get_settings().log_level)
 
-init_db_with_data()
+class TaskHelperMCP(FastMCP):
+    """FastMCP server that profiles tool calls when --profile is set"""
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]):
+        # Time outside of the tool body is spent validating arguments and
+        # converting the result
+        with profile_invocation(f"mcp {name}"), timed("serialization"):
+            return await super().call_tool(name, arguments)
+
+
+mcp = TaskHelperMCP(
+    "taskhelper",
+    log_level=get_settings().log_level,
+    host=get_settings().host,
+    port=get_settings().port,
+)
+
+if not get_settings().multi_root:
+    init_db_with_data()
+
+
+@contextmanager
+def project_root(root: str | None):
+    """Select the project root for a tool call"""
+    settings = get_settings()
+    if (
+        root is not None
+        and not settings.multi_root
+        and os.path.abspath(root) != os.path.abspath(settings.root)
+    ):
+        raise ValueError("Pass --multi-root to serve roots other than --root")
+    with open_root(root), timed("other"):
+        yield
 
 
 @mcp.tool()
@@ -29,8 +88,10 @@ def create_task(
     status: Status = "todo",
     description: str | None = None,
     parent_id: str | None = None,
+    dedupe_threshold: float | None = None,
+    root: str | None = None,
 ) -> Task:
-    """Create a new task"""
+    """Create a new task. If dedupe_threshold (0-1) is given, creation fails when existing tasks are at least that similar."""
     task_create = TaskCreate(
         title=title,
         description=description,
@@ -39,21 +100,44 @@ def create_task(
         complexity=complexity,
         parent_id=parent_id,
     )
-    return db_create_task(task_create)
+    with project_root(root):
+        return db_create_task(task_create, dedupe_threshold)
 
 
 @mcp.tool()
-def get_task(task_id: str) -> Task | None:
-    """Get a task by ID"""
-    return db_get_task(task_id)
+def get_task(
+    task_id: str, fields: list[TaskField] | None = None, root: str | None = None
+) -> Task | PartialTask | None:
+    """Get a task by ID. Pass fields to return only those fields (id is always included)."""
+    with project_root(root):
+        return db_get_task(task_id, fields)
+
+
+@mcp.tool()
+def find_similar_tasks(
+    title: str,
+    description: str | None = None,
+    threshold: float = 0.5,
+    limit: int = 10,
+    root: str | None = None,
+) -> list[SimilarTask]:
+    """Find existing tasks similar to a title and description, most similar first. Use before creating a task to avoid duplicates."""
+    with project_root(root):
+        return db_find_similar_tasks(title, description, threshold, limit)
 
 
 @mcp.tool()
 def list_tasks(
-    statuses: list[Status] | None = None, parent_id: str | None = None
-) -> list[Task]:
-    """List all tasks, optionally filtered by statuses or parent_id. Defaults to ['todo', 'inprogress'] if no statuses provided."""
-    return db_list_tasks(statuses, parent_id)
+    statuses: list[Status] | None = None,
+    parent_id: str | None = None,
+    fields: list[TaskField] | None = None,
+    compact: bool = False,
+    root: str | None = None,
+) -> list[Task] | list[PartialTask] | TaskTable:
+    """List all tasks, optionally filtered by statuses or parent_id. Defaults to ['todo', 'inprogress'] if no statuses provided. Pass fields (e.g. ['id', 'title', 'status']) to return only those fields, and compact=true to return a table of columns and row arrays."""
+    with project_root(root):
+        tasks = db_list_tasks(statuses, parent_id, fields)
+    return TaskTable.from_tasks(tasks, fields) if compact else tasks
 
 
 @mcp.tool()
@@ -65,8 +149,10 @@ def update_task(
     priority: Priority | None = None,
     complexity: Complexity | None = None,
     parent_id: str | None = None,
+    expected_version: int | None = None,
+    root: str | None = None,
 ) -> Task | None:
-    """Update a task by ID"""
+    """Update a task by ID. If expected_version is given, the update fails when the task has been modified since that version."""
     task_update = TaskUpdate(
         title=title,
         description=description,
@@ -75,13 +161,106 @@ def update_task(
         complexity=complexity,
         parent_id=parent_id,
     )
-    return db_update_task(task_id, task_update)
+    with project_root(root):
+        return db_update_task(task_id, task_update, expected_version)
+
+
+@mcp.tool()
+def set_subtree_status(
+    task_id: str,
+    status: Status,
+    include_self: bool = True,
+    fields: list[TaskField] | None = None,
+    compact: bool = False,
+    root: str | None = None,
+) -> list[Task] | list[PartialTask] | TaskTable | None:
+    """Set the status of a task's descendants, and the task itself if include_self, in one operation. Returns the tasks that changed, limited to fields and encoded as a table when compact is true, like list_tasks."""
+    with project_root(root):
+        tasks = db_set_subtree_status(task_id, status, include_self, fields)
+    if tasks is None:
+        return None
+    return TaskTable.from_tasks(tasks, fields) if compact else tasks
+
+
+@mcp.tool()
+def delete_task(
+    task_id: str, expected_version: int | None = None, root: str | None = None
+) -> Task | None:
+    """Delete a task by ID. If expected_version is given, the delete fails when the task has been modified since that version."""
+    with project_root(root):
+        return db_delete_task(task_id, expected_version)
+
+
+@mcp.tool()
+def add_dependency(
+    task_id: str, blocked_by_id: str, root: str | None = None
+) -> TaskDependency | None:
+    """Record that task_id cannot start before blocked_by_id is done. Fails if this would create a dependency cycle; returns null if either task does not exist."""
+    with project_root(root):
+        return db_add_dependency(task_id, blocked_by_id)
+
+
+@mcp.tool()
+def remove_dependency(
+    task_id: str, blocked_by_id: str, root: str | None = None
+) -> TaskDependency | None:
+    """Remove the dependency of task_id on blocked_by_id"""
+    with project_root(root):
+        return db_remove_dependency(task_id, blocked_by_id)
+
+
+@mcp.tool()
+def list_dependencies(
+    task_id: str | None = None, root: str | None = None
+) -> list[TaskDependency]:
+    """List dependencies, optionally only the tasks blocking task_id"""
+    with project_root(root):
+        return db_list_dependencies(task_id)
+
+
+@mcp.tool()
+def next_tasks(
+    limit: int = 10, parent_id: str | None = None, root: str | None = None
+) -> list[Task]:
+    """Get todo tasks that are not blocked by unfinished tasks, highest priority and lowest complexity first. Pass parent_id to only consider that task's descendants at any depth."""
+    with project_root(root):
+        return db_next_tasks(limit, parent_id)
+
+
+@mcp.tool()
+def archive_tasks(
+    task_id: str | None = None,
+    older_than_days: float | None = None,
+    root: str | None = None,
+) -> list[Task] | None:
+    """Move completed subtrees out of the active task list into the archive and return the root task of each. Pass task_id to archive only that subtree, which must be entirely done, and older_than_days to only archive tasks last updated at least that long ago."""
+    with project_root(root):
+        return db_archive_tasks(task_id, older_than_days)
+
+
+@mcp.tool()
+def list_archived_tasks(
+    task_id: str | None = None, root: str | None = None
+) -> list[Task]:
+    """List archived tasks, optionally only the subtree of task_id"""
+    with project_root(root):
+        return db_list_archived_tasks(task_id)
+
+
+@mcp.tool()
+def changes_since(
+    seq: int = 0, limit: int = 100, root: str | None = None
+) -> ChangeFeed:
+    """Get task changes recorded after sequence number seq, oldest first. Pass last_seq from the result as seq on the next call. If reset is true, older changes were compacted and tasks should be re-listed."""
+    with project_root(root):
+        return db_changes_since(seq, limit)
 
 
 @mcp.tool()
-def delete_task(task_id: str) -> Task | None:
-    """Delete a task by ID"""
-    return db_delete_task(task_id)
+def snapshot_database(root: str | None = None) -> None:
+    """Write the tasks to the .tasks/ export now. With --storage memory this also backs up the in-memory database to disk, which otherwise happens at most every --snapshot-interval seconds and on exit."""
+    with project_root(root):
+        db_snapshot_database()
 
 
 def run_mcp():
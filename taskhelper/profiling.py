@@ -0,0 +1,170 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import Engine, event
+
+from .config import get_settings
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - optional sampling profiler
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ["sql", "export", "serialization", "other"]
+
+
+@dataclass
+class _Timings:
+    """Exclusive time per category: entering a category pauses the enclosing one"""
+
+    seconds: dict[str, float] = field(
+        default_factory=lambda: dict.fromkeys(CATEGORIES, 0.0)
+    )
+    stack: list[list] = field(default_factory=list)
+
+    def enter(self, category: str):
+        now = time.perf_counter()
+        if self.stack:
+            outer = self.stack[-1]
+            self.seconds[outer[0]] += now - outer[1]
+        self.stack.append([category, now])
+
+    def exit(self):
+        now = time.perf_counter()
+        category, started = self.stack.pop()
+        self.seconds[category] += now - started
+        if self.stack:
+            self.stack[-1][1] = now
+
+
+_timings: ContextVar[_Timings | None] = ContextVar("profile_timings", default=None)
+_profiling = threading.Lock()
+
+
+@contextmanager
+def timed(category: str) -> Iterator[None]:
+    """Attribute the time spent in the block to category while profiling"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    timings.enter(category)
+    try:
+        yield
+    finally:
+        timings.exit()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _timings.get()
+    if timings is not None:
+        timings.enter("sql")
+
+
+def _exit_sql():
+    timings = _timings.get()
+    if timings is not None and timings.stack and timings.stack[-1][0] == "sql":
+        timings.exit()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _exit_sql()
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    _exit_sql()
+
+
+def get_profile_dir() -> str:
+    """Get the folder profiles are written to, relative paths being under --root"""
+    settings = get_settings()
+    return os.path.join(settings.root, settings.profile_dir)
+
+
+def _summary(name: str, seconds: float, timings: _Timings, profiler_name: str) -> str:
+    lines = [f"{name}: {seconds:.4f}s ({profiler_name})", ""]
+    for category in CATEGORIES:
+        spent = timings.seconds[category]
+        share = spent / seconds * 100 if seconds else 0.0
+        lines.append(f"  {category:<14}{spent:.4f}s {share:5.1f}%")
+    return "\n".join(lines) + "\n\n"
+
+
+@contextmanager
+def profile_invocation(name: str) -> Iterator[None]:
+    """Profile the block when --profile is set, writing a profile and a summary
+    of the top functions and the time split across SQL, export, serialization
+    and everything else to a new file in the profile folder
+
+    Uses pyinstrument's sampling profiler when it is installed and cProfile
+    otherwise. Invocations that start while another one is being profiled,
+    such as concurrent MCP tool calls, are not profiled.
+    """
+    if not get_settings().profile or not _profiling.acquire(blocking=False):
+        yield
+        return
+
+    timings = _Timings()
+    token = _timings.set(timings)
+    if pyinstrument is not None:
+        profiler = pyinstrument.Profiler(async_mode="enabled")
+        start, stop = profiler.start, profiler.stop
+    else:
+        profiler = cProfile.Profile()
+        start, stop = profiler.enable, profiler.disable
+
+    started = time.perf_counter()
+    timings.enter("other")
+    start()
+    try:
+        yield
+    finally:
+        stop()
+        timings.exit()
+        seconds = time.perf_counter() - started
+        _timings.reset(token)
+        try:
+            _write_profile(name, seconds, timings, profiler)
+        finally:
+            _profiling.release()
+
+
+def _write_profile(name: str, seconds: float, timings: _Timings, profiler):
+    profile_dir = get_profile_dir()
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    slug = re.sub(r"[^\w.-]+", "-", name)
+    path = os.path.join(profile_dir, f"{stamp}-{os.getpid()}-{slug}")
+
+    if pyinstrument is not None:
+        summary = _summary(name, seconds, timings, "pyinstrument")
+        summary += profiler.output_text()
+        with open(f"{path}.html", "w") as fp:
+            fp.write(profiler.output_html())
+    else:
+        summary = _summary(name, seconds, timings, "cProfile")
+        stats_output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_output)
+        stats.sort_stats("cumulative").print_stats(25)
+        summary += stats_output.getvalue()
+        stats.dump_stats(f"{path}.prof")
+
+    with open(f"{path}.txt", "w") as fp:
+        fp.write(summary)
+    logger.info(f"Wrote profile of {name} to {path}.txt")
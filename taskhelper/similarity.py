@@ -0,0 +1,23 @@
+import re
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def task_text(title: str, description: str | None) -> str:
+    """Get the text of a task that is compared for similarity"""
+    return f"{title} {description}" if description else title
+
+
+def trigrams(text: str) -> set[str]:
+    """Split text into lowercase word trigrams, padding each word with a space"""
+    result: set[str] = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f" {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def jaccard(shared: int, count_a: int, count_b: int) -> float:
+    """Jaccard similarity of two trigram sets given their sizes and overlap"""
+    union = count_a + count_b - shared
+    return shared / union if union else 0.0
@@ -1,14 +1,28 @@
 from datetime import datetime
-from typing import Literal, TYPE_CHECKING
+from typing import Any, Literal, TYPE_CHECKING
 
-from pydantic import BaseModel
+from pydantic import BaseModel, model_serializer
 
 if TYPE_CHECKING:
     from .db import Task as DBTask
+    from .db import TaskChange as DBTaskChange
 
 Status = Literal["todo", "inprogress", "done"]
 Priority = Literal["low", "medium", "high"]
 Complexity = Literal["low", "medium", "high"]
+ChangeOperation = Literal["create", "update", "delete", "archive"]
+TaskField = Literal[
+    "id",
+    "title",
+    "description",
+    "status",
+    "priority",
+    "complexity",
+    "created_at",
+    "updated_at",
+    "parent_id",
+    "version",
+]
 
 
 class Task(BaseModel):
@@ -21,6 +35,7 @@ class Task(BaseModel):
     created_at: datetime | None = None
     updated_at: datetime | None = None
     parent_id: str | None = None
+    version: int | None = None
 
     @classmethod
     def from_db(cls, db_task: "DBTask") -> "Task":
@@ -35,9 +50,62 @@ class Task(BaseModel):
             parent_id=db_task.parent_hierarchical_id,
             created_at=db_task.created_at,
             updated_at=db_task.updated_at,
+            version=db_task.version,
         )
 
 
+class PartialTask(BaseModel):
+    """A Task holding only the fields that were requested; unset fields are
+    left out when serialized"""
+
+    id: str
+    title: str | None = None
+    description: str | None = None
+    status: Status | None = None
+    priority: Priority | None = None
+    complexity: Complexity | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    parent_id: str | None = None
+    version: int | None = None
+
+    @model_serializer(mode="wrap")
+    def serialize_set_fields(self, handler):
+        data = handler(self)
+        return {
+            key: value for key, value in data.items() if key in self.model_fields_set
+        }
+
+    @classmethod
+    def project(cls, task: Task, fields: list[TaskField]) -> "PartialTask":
+        """Create a PartialTask with only the given fields of a Task"""
+        return cls(**{field: getattr(task, field) for field in task_fields(fields)})
+
+
+class TaskTable(BaseModel):
+    """Compact tabular encoding of tasks: a column header and one array per row"""
+
+    columns: list[TaskField]
+    rows: list[list[Any]]
+
+    @classmethod
+    def from_tasks(
+        cls, tasks: list[Task] | list[PartialTask], fields: list[TaskField] | None
+    ) -> "TaskTable":
+        columns = task_fields(fields)
+        return cls(
+            columns=columns,
+            rows=[[getattr(task, column) for column in columns] for task in tasks],
+        )
+
+
+def task_fields(fields: list[TaskField] | None) -> list[TaskField]:
+    """Get the fields to return for a projection, always starting with id"""
+    if fields is None:
+        return list(Task.model_fields)
+    return ["id", *(field for field in dict.fromkeys(fields) if field != "id")]
+
+
 class TaskCreate(BaseModel):
     title: str
     description: str | None
@@ -47,6 +115,21 @@ class TaskCreate(BaseModel):
     parent_id: str | None = None
 
 
+class TaskImport(TaskCreate):
+    description: str | None = None
+    ref: str | None = None
+    parent: str | None = None
+
+
+class ImportResult(BaseModel):
+    imported: int
+    seconds: float
+
+    @property
+    def tasks_per_second(self) -> float:
+        return self.imported / self.seconds if self.seconds else 0.0
+
+
 class TaskUpdate(BaseModel):
     title: str | None = None
     description: str | None = None
@@ -54,3 +137,41 @@ class TaskUpdate(BaseModel):
     priority: Priority | None = None
     complexity: Complexity | None = None
     parent_id: str | None = None
+
+
+class TaskChange(BaseModel):
+    seq: int
+    task_id: str
+    operation: ChangeOperation
+    imported: bool = False
+    task: Task | None = None
+    changed_at: datetime | None = None
+
+    @classmethod
+    def from_db(cls, db_change: "DBTaskChange") -> "TaskChange":
+        """Create a TaskChange instance from a database TaskChange object"""
+        return cls(
+            seq=db_change.seq,
+            task_id=db_change.task_id,
+            operation=db_change.operation,
+            imported=db_change.imported,
+            task=Task.model_validate_json(db_change.task) if db_change.task else None,
+            changed_at=db_change.changed_at,
+        )
+
+
+class ChangeFeed(BaseModel):
+    changes: list[TaskChange]
+    last_seq: int
+    has_more: bool = False
+    reset: bool = False
+
+
+class TaskDependency(BaseModel):
+    task_id: str
+    blocked_by_id: str
+
+
+class SimilarTask(BaseModel):
+    task: Task
+    score: float
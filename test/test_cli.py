@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+
+from click.testing import CliRunner
+
+from taskhelper.cli import cli
+from taskhelper.db import import_tasks, list_tasks, open_root
+from taskhelper.task import TaskImport
+
+
+def import_sample_tasks(root: str):
+    with open_root(root):
+        import_tasks(
+            [
+                TaskImport(
+                    ref="epic",
+                    title="Epic",
+                    status="todo",
+                    priority="high",
+                    complexity="high",
+                ),
+                *(
+                    TaskImport(
+                        parent="epic",
+                        title=f"Story {n}",
+                        status="done" if n % 2 else "todo",
+                        priority="low",
+                        complexity="low",
+                    )
+                    for n in range(1, 11)
+                ),
+            ]
+        )
+
+
+def test_list_tasks_hierarchical_order(tmp_path):
+    import_sample_tasks(str(tmp_path))
+
+    with open_root(str(tmp_path)):
+        ids = [task.id for task in list_tasks(statuses=[])]
+
+    assert ids == ["1", *(f"1.{n}" for n in range(1, 11))]
+    assert ids.index("1.2") < ids.index("1.10")
+
+
+def test_list_csv(tmp_path):
+    import_sample_tasks(str(tmp_path))
+
+    with open_root(str(tmp_path)):
+        result = CliRunner().invoke(cli, ["list", "-s", "done", "-f", "csv"])
+
+    assert result.exit_code == 0, result.output
+    rows = list(csv.DictReader(io.StringIO(result.output)))
+    assert [row["ID"] for row in rows] == ["1.1", "1.3", "1.5", "1.7", "1.9"]
+    assert all(row["Status"] == "done" for row in rows)
+
+
+def test_list_ndjson(tmp_path):
+    import_sample_tasks(str(tmp_path))
+
+    with open_root(str(tmp_path)):
+        result = CliRunner().invoke(
+            cli, ["list", "-s", "todo", "-s", "done", "-f", "ndjson"]
+        )
+
+    assert result.exit_code == 0, result.output
+    tasks = [json.loads(line) for line in result.output.splitlines()]
+    assert [task["id"] for task in tasks] == ["1", *(f"1.{n}" for n in range(1, 11))]
+    assert tasks[-1]["title"] == "Story 10"
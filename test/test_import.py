@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+from taskhelper.db import import_tasks, list_tasks, open_root
+from taskhelper.importer import read_tasks
+
+DEFAULTS = {"status": "todo", "priority": "medium", "complexity": "low"}
+
+
+def test_import_markdown_checklist(tmp_path):
+    checklist = io.StringIO(
+        "# Backlog\n"
+        "- [ ] Epic\n"
+        "  - [ ] Story A\n"
+        "    - [x] Subtask\n"
+        "  - [ ] Story B\n"
+        "- [x] Chore\n"
+    )
+    with open_root(str(tmp_path)):
+        result = import_tasks(read_tasks(checklist, "markdown", DEFAULTS))
+        tasks = list_tasks(statuses=[])
+
+    assert result.imported == 5
+    assert [(t.id, t.title, t.status, t.parent_id) for t in tasks] == [
+        ("1", "Epic", "todo", None),
+        ("1.1", "Story A", "todo", "1"),
+        ("1.1.1", "Subtask", "done", "1.1"),
+        ("1.2", "Story B", "todo", "1"),
+        ("2", "Chore", "done", None),
+    ]
+    assert (tmp_path / ".tasks" / "tasks.ndjson").exists()
+
+
+def test_import_ndjson_refs(tmp_path):
+    records = io.StringIO(
+        '{"ref": "root", "title": "Root", "priority": "high"}\n'
+        '{"parent": "root", "title": "Child"}\n'
+    )
+    with open_root(str(tmp_path)):
+        import_tasks(read_tasks(records, "ndjson", DEFAULTS))
+        tasks = list_tasks()
+
+    assert [(t.id, t.priority, t.parent_id) for t in tasks] == [
+        ("1", "high", None),
+        ("1.1", "medium", "1"),
+    ]
+
+
+def test_import_unknown_parent_rolls_back(tmp_path):
+    records = io.StringIO('{"title": "Kept?"}\n{"parent": "missing", "title": "Bad"}\n')
+    with open_root(str(tmp_path)):
+        with pytest.raises(ValueError, match="Unknown parent reference"):
+            import_tasks(read_tasks(records, "ndjson", DEFAULTS))
+        assert list_tasks() == []
+
+
+def test_import_csv_rejects_bad_rows(tmp_path):
+    with open_root(str(tmp_path)):
+        with pytest.raises(ValueError, match="Line 2: more values"):
+            import_tasks(
+                read_tasks(
+                    io.StringIO("title,priority\nA,low,extra\n"), "csv", DEFAULTS
+                )
+            )
+        with pytest.raises(ValueError, match="Line 3: unknown fields owner"):
+            import_tasks(
+                read_tasks(io.StringIO("title,owner\nA,\nB,me\n"), "csv", DEFAULTS)
+            )
+        assert list_tasks() == []
+
+
+def test_import_ndjson_rejects_bad_lines(tmp_path):
+    with open_root(str(tmp_path)):
+        with pytest.raises(ValueError, match="Line 3: invalid JSON"):
+            import_tasks(
+                read_tasks(
+                    io.StringIO('{"title": "A"}\n\n{"title": \n'), "ndjson", DEFAULTS
+                )
+            )
+        with pytest.raises(ValueError, match="Line 2: expected a JSON object"):
+            import_tasks(
+                read_tasks(io.StringIO('{"title": "A"}\n["x"]\n'), "ndjson", DEFAULTS)
+            )
+        assert list_tasks() == []
@@ -0,0 +1,17 @@
+from taskhelper.loadtest import percentile, run_load_test
+
+
+def test_percentile():
+    values = [float(n) for n in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 95) == 3.0
+
+
+def test_run_load_test(tmp_path):
+    result = run_load_test(clients=3, requests=10, read_ratio=0.5, root=str(tmp_path))
+
+    assert result.problems == []
+    assert result.stats.requests == 30
+    assert sum(result.stats.errors.values()) == 0
+    assert (tmp_path / ".tasks" / "tasks.ndjson").exists()
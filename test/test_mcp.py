@@ -1,4 +1,6 @@
 import pytest
+from mcp.server.fastmcp.exceptions import ToolError
+from taskhelper.config import get_settings
 from taskhelper.mcp import mcp
 
 pytestmark = pytest.mark.anyio
@@ -113,3 +115,427 @@ async def test_delete_task(mcp_client):
     assert data["id"] == task_id
     get_result = await mcp_client.call_tool("get_task", {"task_id": task_id})
     assert extract_structured_data(get_result) is None
+
+
+async def test_update_task_expected_version(mcp_client):
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {"title": "Versioned Task", "priority": "low", "complexity": "low"},
+    )
+    created = extract_structured_data(create_result)
+    task_id = created["id"]
+    assert created["version"] == 1
+
+    result = await mcp_client.call_tool(
+        "update_task",
+        {"task_id": task_id, "status": "inprogress", "expected_version": 1},
+    )
+    assert extract_structured_data(result)["version"] == 2
+
+    with pytest.raises(ToolError, match="modified concurrently"):
+        await mcp_client.call_tool(
+            "update_task",
+            {"task_id": task_id, "status": "done", "expected_version": 1},
+        )
+    with pytest.raises(ToolError, match="modified concurrently"):
+        await mcp_client.call_tool(
+            "delete_task", {"task_id": task_id, "expected_version": 1}
+        )
+
+    result = await mcp_client.call_tool(
+        "delete_task", {"task_id": task_id, "expected_version": 2}
+    )
+    assert extract_structured_data(result)["id"] == task_id
+
+
+async def test_multi_root(mcp_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "multi_root", True)
+    root_a = tmp_path / "a"
+    root_b = tmp_path / "b"
+    root_a.mkdir()
+    root_b.mkdir()
+
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "Root A Task",
+            "priority": "low",
+            "complexity": "low",
+            "root": str(root_a),
+        },
+    )
+    assert extract_structured_data(create_result)["id"] == "1"
+
+    result = await mcp_client.call_tool("list_tasks", {"root": str(root_b)})
+    data = extract_structured_data(result)
+    data = data if isinstance(data, list) else data["result"]
+    assert data == []
+
+    assert (root_a / ".tasks" / "tasks.ndjson").exists()
+    assert not (root_b / ".tasks").exists()
+
+
+async def test_changes_since(mcp_client):
+    result = await mcp_client.call_tool("changes_since", {"seq": 0, "limit": 100000})
+    seq = extract_structured_data(result)["last_seq"]
+
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {"title": "Tracked Task", "priority": "low", "complexity": "low"},
+    )
+    task_id = extract_structured_data(create_result)["id"]
+    await mcp_client.call_tool("update_task", {"task_id": task_id, "status": "done"})
+    await mcp_client.call_tool("delete_task", {"task_id": task_id})
+
+    result = await mcp_client.call_tool("changes_since", {"seq": seq})
+    data = extract_structured_data(result)
+    assert [c["operation"] for c in data["changes"]] == ["create", "update", "delete"]
+    assert all(c["task_id"] == task_id for c in data["changes"])
+    assert data["changes"][1]["task"]["status"] == "done"
+    assert data["last_seq"] == data["changes"][-1]["seq"]
+    assert not data["has_more"]
+
+    result = await mcp_client.call_tool(
+        "changes_since", {"seq": data["last_seq"], "limit": 10}
+    )
+    assert extract_structured_data(result)["changes"] == []
+
+
+async def test_changes_compacted_on_write(mcp_client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "change_log_size", 10)
+    for n in range(20):
+        await mcp_client.call_tool(
+            "create_task",
+            {"title": f"Churn {n}", "priority": "low", "complexity": "low"},
+        )
+
+    result = await mcp_client.call_tool("changes_since", {"seq": 0, "limit": 100000})
+    data = extract_structured_data(result)
+    assert data["reset"]
+    assert 10 <= len(data["changes"]) <= 11
+    assert data["changes"][-1]["task"]["title"] == "Churn 19"
+
+
+async def test_find_similar_tasks(mcp_client):
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "Refactor the websocket reconnection backoff",
+            "priority": "low",
+            "complexity": "low",
+        },
+    )
+    task_id = extract_structured_data(create_result)["id"]
+
+    result = await mcp_client.call_tool(
+        "find_similar_tasks",
+        {"title": "Refactor websocket reconnection backoff", "threshold": 0.5},
+    )
+    data = extract_structured_data(result)
+    assert data[0]["task"]["id"] == task_id
+    assert data[0]["score"] >= 0.5
+
+    with pytest.raises(ToolError, match="Similar tasks already exist"):
+        await mcp_client.call_tool(
+            "create_task",
+            {
+                "title": "Refactor the websocket reconnect backoff",
+                "priority": "low",
+                "complexity": "low",
+                "dedupe_threshold": 0.5,
+            },
+        )
+
+    await mcp_client.call_tool(
+        "update_task", {"task_id": task_id, "title": "Unrelated chore"}
+    )
+    result = await mcp_client.call_tool(
+        "find_similar_tasks",
+        {"title": "Refactor websocket reconnection backoff", "threshold": 0.5},
+    )
+    assert all(m["task"]["id"] != task_id for m in extract_structured_data(result))
+
+
+async def test_set_subtree_status(mcp_client):
+    create_result = await mcp_client.call_tool(
+        "create_task", {"title": "Epic", "priority": "high", "complexity": "high"}
+    )
+    epic_id = extract_structured_data(create_result)["id"]
+    child_ids = []
+    for title in ["Story A", "Story B"]:
+        create_result = await mcp_client.call_tool(
+            "create_task",
+            {
+                "title": title,
+                "priority": "low",
+                "complexity": "low",
+                "parent_id": epic_id,
+            },
+        )
+        child_ids.append(extract_structured_data(create_result)["id"])
+
+    result = await mcp_client.call_tool(
+        "set_subtree_status",
+        {"task_id": epic_id, "status": "done", "include_self": False},
+    )
+    data = extract_structured_data(result)
+    assert [t["id"] for t in data] == child_ids
+    assert all(t["status"] == "done" for t in data)
+
+    get_result = await mcp_client.call_tool("get_task", {"task_id": epic_id})
+    assert extract_structured_data(get_result)["status"] == "todo"
+
+    result = await mcp_client.call_tool(
+        "set_subtree_status", {"task_id": epic_id, "status": "done"}
+    )
+    assert [t["id"] for t in extract_structured_data(result)] == [epic_id]
+
+
+async def test_list_tasks_fields(mcp_client):
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "Projected Task",
+            "priority": "low",
+            "complexity": "low",
+            "description": "A long description",
+        },
+    )
+    task_id = extract_structured_data(create_result)["id"]
+
+    result = await mcp_client.call_tool(
+        "get_task", {"task_id": task_id, "fields": ["title", "status"]}
+    )
+    assert extract_structured_data(result) == {
+        "id": task_id,
+        "title": "Projected Task",
+        "status": "todo",
+    }
+
+    result = await mcp_client.call_tool(
+        "list_tasks", {"statuses": ["todo"], "fields": ["title"]}
+    )
+    data = extract_structured_data(result)
+    assert all(set(t) == {"id", "title"} for t in data)
+    assert {"id": task_id, "title": "Projected Task"} in data
+
+    result = await mcp_client.call_tool(
+        "list_tasks", {"statuses": ["todo"], "fields": ["title"], "compact": True}
+    )
+    data = extract_structured_data(result)
+    assert data["columns"] == ["id", "title"]
+    assert [task_id, "Projected Task"] in data["rows"]
+
+
+async def test_next_tasks(mcp_client):
+    create_result = await mcp_client.call_tool(
+        "create_task", {"title": "Release", "priority": "low", "complexity": "low"}
+    )
+    epic_id = extract_structured_data(create_result)["id"]
+    ids = {}
+    for title, priority in [("Build", "medium"), ("Test", "high"), ("Ship", "high")]:
+        create_result = await mcp_client.call_tool(
+            "create_task",
+            {
+                "title": title,
+                "priority": priority,
+                "complexity": "low",
+                "parent_id": epic_id,
+            },
+        )
+        ids[title] = extract_structured_data(create_result)["id"]
+
+    for task, blocker in [("Test", "Build"), ("Ship", "Test")]:
+        await mcp_client.call_tool(
+            "add_dependency", {"task_id": ids[task], "blocked_by_id": ids[blocker]}
+        )
+
+    with pytest.raises(ToolError):
+        await mcp_client.call_tool(
+            "add_dependency", {"task_id": ids["Build"], "blocked_by_id": ids["Ship"]}
+        )
+
+    result = await mcp_client.call_tool("next_tasks", {"parent_id": epic_id})
+    assert [t["id"] for t in extract_structured_data(result)] == [ids["Build"]]
+
+    await mcp_client.call_tool(
+        "update_task", {"task_id": ids["Build"], "status": "done"}
+    )
+    result = await mcp_client.call_tool("next_tasks", {"parent_id": epic_id})
+    assert [t["id"] for t in extract_structured_data(result)] == [ids["Test"]]
+
+    await mcp_client.call_tool(
+        "remove_dependency", {"task_id": ids["Ship"], "blocked_by_id": ids["Test"]}
+    )
+    result = await mcp_client.call_tool("next_tasks", {"parent_id": epic_id})
+    assert [t["id"] for t in extract_structured_data(result)] == [
+        ids["Test"],
+        ids["Ship"],
+    ]
+
+
+async def test_archive_tasks(mcp_client):
+    create_result = await mcp_client.call_tool(
+        "create_task", {"title": "Old Epic", "priority": "low", "complexity": "low"}
+    )
+    epic_id = extract_structured_data(create_result)["id"]
+    await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "Old Story",
+            "priority": "low",
+            "complexity": "low",
+            "parent_id": epic_id,
+        },
+    )
+
+    with pytest.raises(ToolError):
+        await mcp_client.call_tool("archive_tasks", {"task_id": epic_id})
+
+    await mcp_client.call_tool(
+        "set_subtree_status", {"task_id": epic_id, "status": "done"}
+    )
+    result = await mcp_client.call_tool("archive_tasks", {"task_id": epic_id})
+    assert [t["id"] for t in extract_structured_data(result)] == [epic_id]
+
+    result = await mcp_client.call_tool("get_task", {"task_id": epic_id})
+    assert extract_structured_data(result) is None
+
+    result = await mcp_client.call_tool("list_archived_tasks", {"task_id": epic_id})
+    assert [t["id"] for t in extract_structured_data(result)] == [
+        epic_id,
+        f"{epic_id}.1",
+    ]
+
+    create_result = await mcp_client.call_tool(
+        "create_task", {"title": "New Epic", "priority": "low", "complexity": "low"}
+    )
+    assert extract_structured_data(create_result)["id"] == str(int(epic_id) + 1)
+
+
+async def create_moved_story(mcp_client):
+    """Create epics A and B and a story under A that is then moved to B,
+    returning the IDs of A, B and the story"""
+    epic_ids = []
+    for title in ["Epic A", "Epic B"]:
+        create_result = await mcp_client.call_tool(
+            "create_task", {"title": title, "priority": "low", "complexity": "low"}
+        )
+        epic_ids.append(extract_structured_data(create_result)["id"])
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "Moved Story",
+            "priority": "low",
+            "complexity": "low",
+            "parent_id": epic_ids[0],
+        },
+    )
+    story_id = extract_structured_data(create_result)["id"]
+    await mcp_client.call_tool(
+        "update_task", {"task_id": story_id, "parent_id": epic_ids[1]}
+    )
+    return epic_ids[0], epic_ids[1], story_id
+
+
+async def test_set_subtree_status_after_move(mcp_client):
+    epic_a, epic_b, story_id = await create_moved_story(mcp_client)
+
+    result = await mcp_client.call_tool(
+        "set_subtree_status",
+        {"task_id": epic_a, "status": "done", "include_self": False},
+    )
+    assert extract_structured_data(result) == []
+
+    result = await mcp_client.call_tool(
+        "set_subtree_status",
+        {"task_id": epic_b, "status": "done", "include_self": False},
+    )
+    assert [t["id"] for t in extract_structured_data(result)] == [story_id]
+
+
+async def test_next_tasks_after_move(mcp_client):
+    epic_a, epic_b, story_id = await create_moved_story(mcp_client)
+
+    result = await mcp_client.call_tool("next_tasks", {"parent_id": epic_a})
+    assert extract_structured_data(result) == []
+    result = await mcp_client.call_tool("next_tasks", {"parent_id": epic_b})
+    assert [t["id"] for t in extract_structured_data(result)] == [story_id]
+
+
+async def test_create_task_after_move(mcp_client):
+    epic_a, epic_b, _ = await create_moved_story(mcp_client)
+
+    # Moved tasks keep their IDs, which must not be handed out again
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "New Story",
+            "priority": "low",
+            "complexity": "low",
+            "parent_id": epic_a,
+        },
+    )
+    assert extract_structured_data(create_result)["id"] == f"{epic_a}.2"
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "Other Story",
+            "priority": "low",
+            "complexity": "low",
+            "parent_id": epic_b,
+        },
+    )
+    assert extract_structured_data(create_result)["id"] == f"{epic_b}.1"
+
+    # as must the IDs of a moved root task and its children
+    await mcp_client.call_tool("update_task", {"task_id": epic_b, "parent_id": epic_a})
+    create_result = await mcp_client.call_tool(
+        "create_task", {"title": "Epic C", "priority": "low", "complexity": "low"}
+    )
+    assert extract_structured_data(create_result)["id"] == str(int(epic_b) + 1)
+
+
+async def test_archive_tasks_after_move(mcp_client):
+    create_result = await mcp_client.call_tool(
+        "create_task", {"title": "Epic", "priority": "low", "complexity": "low"}
+    )
+    epic_id = extract_structured_data(create_result)["id"]
+    create_result = await mcp_client.call_tool(
+        "create_task",
+        {
+            "title": "Story",
+            "priority": "low",
+            "complexity": "low",
+            "parent_id": epic_id,
+        },
+    )
+    story_id = extract_structured_data(create_result)["id"]
+    await mcp_client.call_tool(
+        "set_subtree_status", {"task_id": epic_id, "status": "done"}
+    )
+    # A shallow ID moved deep into a done subtree must still hold it back
+    create_result = await mcp_client.call_tool(
+        "create_task", {"title": "Chore", "priority": "low", "complexity": "low"}
+    )
+    chore_id = extract_structured_data(create_result)["id"]
+    await mcp_client.call_tool(
+        "update_task", {"task_id": chore_id, "parent_id": story_id}
+    )
+
+    with pytest.raises(ToolError):
+        await mcp_client.call_tool("archive_tasks", {"task_id": epic_id})
+    result = await mcp_client.call_tool("archive_tasks", {})
+    archived_ids = {t["id"] for t in extract_structured_data(result)}
+    assert not archived_ids & {epic_id, story_id, chore_id}
+
+    await mcp_client.call_tool("update_task", {"task_id": chore_id, "status": "done"})
+    result = await mcp_client.call_tool("archive_tasks", {"task_id": epic_id})
+    assert [t["id"] for t in extract_structured_data(result)] == [epic_id]
+
+    result = await mcp_client.call_tool("list_archived_tasks", {"task_id": epic_id})
+    assert [t["id"] for t in extract_structured_data(result)] == [
+        epic_id,
+        story_id,
+        chore_id,
+    ]
@@ -0,0 +1,20 @@
+import pytest
+
+from taskhelper.config import get_settings
+from taskhelper.mcp import mcp
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_profile_tool_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "profile", True)
+    monkeypatch.setattr(get_settings(), "profile_dir", str(tmp_path))
+
+    await mcp.call_tool("list_tasks", {})
+
+    summaries = list(tmp_path.glob("*-mcp-list_tasks.txt"))
+    assert len(summaries) == 1
+    summary = summaries[0].read_text()
+    assert summary.startswith("mcp list_tasks: ")
+    for category in ["sql", "export", "serialization", "other"]:
+        assert f"  {category} " in summary
@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import sqlite3
+
+import taskhelper.db
+from taskhelper.config import get_settings
+from taskhelper.db import (
+    archive_tasks,
+    close_root,
+    create_task,
+    get_task,
+    list_archived_tasks,
+    list_tasks,
+    open_root,
+    snapshot_database,
+    update_task,
+)
+from taskhelper.task import TaskCreate, TaskUpdate
+
+
+def test_memory_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "storage", "memory")
+    monkeypatch.setattr(get_settings(), "snapshot_interval", 3600.0)
+    db_path = tmp_path / ".tasks.db"
+    export_path = tmp_path / ".tasks" / "tasks.ndjson"
+
+    with open_root(str(tmp_path)):
+        task = create_task(
+            TaskCreate(
+                title="In memory",
+                description=None,
+                status="todo",
+                priority="low",
+                complexity="low",
+            )
+        )
+        assert not db_path.exists()
+        assert not export_path.exists()
+
+        snapshot_database()
+
+    assert "In memory" in export_path.read_text()
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute("SELECT hierarchical_id, title FROM tasks").fetchall()
+    assert rows == [(task.id, "In memory")]
+
+    close_root(str(tmp_path))
+    with open_root(str(tmp_path)):
+        restored = get_task(task.id)
+    assert restored is not None and restored.title == "In memory"
+    close_root(str(tmp_path))
+
+
+def _update_with_slow_export(root, committed, proceed):
+    dump_database = taskhelper.db.dump_database
+
+    def slow_dump_database():
+        committed.set()
+        proceed.wait(30)
+        dump_database()
+
+    taskhelper.db.dump_database = slow_dump_database
+    with open_root(root):
+        update_task("1", TaskUpdate(title="Changed"), expected_version=1)
+
+
+def _start_up(root, started):
+    started.set()
+    with open_root(root):
+        get_task("1")
+
+
+def test_load_waits_for_pending_export(tmp_path):
+    root = str(tmp_path)
+    with open_root(root):
+        create_task(
+            TaskCreate(
+                title="Orig",
+                description=None,
+                status="todo",
+                priority="low",
+                complexity="low",
+            )
+        )
+    close_root(root)
+
+    context = multiprocessing.get_context("spawn")
+    committed, proceed, started = context.Event(), context.Event(), context.Event()
+    writer = context.Process(
+        target=_update_with_slow_export, args=(root, committed, proceed)
+    )
+    reader = context.Process(target=_start_up, args=(root, started))
+    writer.start()
+    try:
+        assert committed.wait(30)
+        # A process starting up between the writer's commit and its export
+        # must not reload the stale export over the committed update
+        reader.start()
+        assert started.wait(30)
+        reader.join(2)
+    finally:
+        proceed.set()
+    writer.join(30)
+    reader.join(30)
+    assert (writer.exitcode, reader.exitcode) == (0, 0)
+
+    with open_root(root):
+        task = get_task("1")
+    assert (task.title, task.version) == ("Changed", 2)
+    assert '"Changed"' in (tmp_path / ".tasks" / "tasks.ndjson").read_text()
+    close_root(root)
+
+
+def _archive_and_exit(root):
+    get_settings().storage = "memory"
+    get_settings().snapshot_interval = 3600.0
+    with open_root(root):
+        epic = create_task(
+            TaskCreate(
+                title="Epic",
+                description=None,
+                status="done",
+                priority="low",
+                complexity="low",
+            )
+        )
+        create_task(
+            TaskCreate(
+                title="Story",
+                description=None,
+                status="done",
+                priority="low",
+                complexity="low",
+                parent_id=epic.id,
+            )
+        )
+        snapshot_database()
+        archive_tasks()
+    # Exit before the archived tasks are snapshotted out of the main export
+    os._exit(0)
+
+
+def test_interrupted_archive_is_settled(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "storage", "memory")
+    monkeypatch.setattr(get_settings(), "snapshot_interval", 3600.0)
+    root = str(tmp_path)
+
+    archiver = multiprocessing.get_context("spawn").Process(
+        target=_archive_and_exit, args=(root,)
+    )
+    archiver.start()
+    archiver.join(30)
+    assert archiver.exitcode == 0
+    assert '"Epic"' in (tmp_path / ".tasks" / "tasks.ndjson").read_text()
+
+    with open_root(root):
+        assert list_tasks(statuses=[]) == []
+        assert [t.id for t in list_archived_tasks()] == ["1", "1.1"]
+        assert archive_tasks() == []
+        snapshot_database()
+    close_root(root)
+    assert '"Epic"' not in (tmp_path / ".tasks" / "tasks.ndjson").read_text()